@@ -1,14 +1,328 @@
 #!/usr/bin/env python3
 
-from aws_iam_db.build_db import init
-from aws_iam_db.docs import get_docs
+from contextlib import contextmanager
+from enum import Enum
+import json
+import os
+from typing import List, Optional
+
 import typer
 
+# Commands import the modules they use when they run, so that --help and the
+# read-only commands start without loading SQLAlchemy, BeautifulSoup or requests.
+app = typer.Typer(rich_markup_mode=None)
+
+WORKERS = typer.Option(8, help="Number of docs pages downloaded at once.")
+RATE_LIMIT = typer.Option(
+    20.0, help="Maximum requests per second sent to the docs host, 0 to disable."
+)
+FULL_REFRESH = typer.Option(
+    False, help="Download and parse every docs page, even unchanged ones."
+)
+JOBS = typer.Option(os.cpu_count() or 1, help="Number of processes parsing docs pages.")
+PARSER = typer.Option("auto", help="HTML parser backend: auto, lxml or html.parser.")
+UPDATE = typer.Option(
+    False, help="Update an existing database, replacing only changed services."
+)
+CACHE_DIR = typer.Option(
+    None,
+    envvar="AWS_IAM_DB_CACHE_DIR",
+    help="Directory caching the downloaded docs pages and their parsed schemas."
+    " Defaults to /tmp/docs/.",
+)
+METRICS = typer.Option(
+    None, help="Write stage, page and table timings to this file as JSON."
+)
+PROFILE = typer.Option(
+    None,
+    help="Profile the command with cProfile, saving the stats to this file. Pages "
+    "parsed in worker processes are only profiled with --jobs 1.",
+)
+
+
+@contextmanager
+def instrumented(metrics_path: Optional[str], profile_path: Optional[str]):
+    """Yields the Metrics to pass to the pipeline, and writes them out after it"""
+    from aws_iam_db.metrics import Metrics, profiled
+
+    metrics = Metrics()
+    with profiled(profile_path):
+        yield metrics
+    if metrics_path:
+        metrics.write(metrics_path)
+
+
+class Kind(str, Enum):
+    action = "action"
+    resource = "resource"
+    condition = "condition"
+
+
+class ExportFormat(str, Enum):
+    parquet = "parquet"
+    arrow = "arrow"
+
+
+@app.command()
+def run(
+    json_path: Optional[str] = typer.Option(
+        None, help="Also write the parsed docs to this file, one service per line."
+    ),
+    db_path: str = "iam.db",
+    workers: int = WORKERS,
+    rate_limit: float = RATE_LIMIT,
+    full_refresh: bool = FULL_REFRESH,
+    jobs: int = JOBS,
+    parser: str = PARSER,
+    update: bool = UPDATE,
+    cache_dir: Optional[str] = CACHE_DIR,
+    metrics: Optional[str] = METRICS,
+    profile: Optional[str] = PROFILE,
+):
+    """Downloads the AWS docs and builds the database from them."""
+    from aws_iam_db.build_db import build
+    from aws_iam_db.docs import DOCS_DIRECTORY, stream_docs, write_ndjson
+
+    with instrumented(metrics, profile) as run_metrics:
+        services = stream_docs(
+            workers,
+            rate_limit,
+            full_refresh=full_refresh,
+            jobs=jobs,
+            parser=parser,
+            metrics=run_metrics,
+            docs_directory=cache_dir or DOCS_DIRECTORY,
+        )
+        if json_path:
+            services = write_ndjson(services, json_path)
+        build(services, db_path, progress=False, update=update, metrics=run_metrics)
+
+
+@app.command()
+def fetch(
+    workers: int = WORKERS,
+    rate_limit: float = RATE_LIMIT,
+    full_refresh: bool = FULL_REFRESH,
+    cache_dir: Optional[str] = CACHE_DIR,
+    metrics: Optional[str] = METRICS,
+    profile: Optional[str] = PROFILE,
+):
+    """Downloads the AWS docs pages that changed since the last run."""
+    from aws_iam_db.docs import DOCS_DIRECTORY, fetch_docs
+
+    with instrumented(metrics, profile) as run_metrics:
+        fetch_docs(
+            workers,
+            rate_limit,
+            full_refresh=full_refresh,
+            metrics=run_metrics,
+            docs_directory=cache_dir or DOCS_DIRECTORY,
+        )
+
+
+@app.command()
+def parse(
+    json_path: str = typer.Argument(
+        "iam.ndjson", help="File to write, one service per line."
+    ),
+    jobs: int = JOBS,
+    parser: str = PARSER,
+    cache_dir: Optional[str] = CACHE_DIR,
+    metrics: Optional[str] = METRICS,
+    profile: Optional[str] = PROFILE,
+):
+    """Parses the docs pages downloaded by fetch."""
+    from aws_iam_db.docs import DOCS_DIRECTORY, load_manifest, parse_docs, write_ndjson
+
+    docs_directory = cache_dir or DOCS_DIRECTORY
+    with instrumented(metrics, profile) as run_metrics:
+        manifest = load_manifest(docs_directory)
+        if not manifest["pages"]:
+            typer.echo(
+                f"No docs pages in {docs_directory}, run `aws-iam-db fetch` first",
+                err=True,
+            )
+            raise typer.Exit(1)
+        services = parse_docs(docs_directory, manifest, jobs, parser, run_metrics)
+        for _ in write_ndjson(services, json_path):
+            pass
+
+
+@app.command("build")
+def build_command(
+    json_path: str = typer.Argument(
+        "iam.ndjson", help="Parsed docs, as NDJSON or a JSON array."
+    ),
+    db_path: str = "iam.db",
+    update: bool = UPDATE,
+    metrics: Optional[str] = METRICS,
+    profile: Optional[str] = PROFILE,
+):
+    """Builds the database from parsed docs."""
+    from aws_iam_db.build_db import init
+
+    if not os.path.isfile(json_path):
+        typer.echo(f"No file {json_path}, run `aws-iam-db parse` first", err=True)
+        raise typer.Exit(1)
+    with instrumented(metrics, profile) as run_metrics:
+        init(json_path, db_path, update=update, metrics=run_metrics)
+
+
+@app.command()
+def query(
+    name: Optional[str] = typer.Argument(
+        None, help="Exact name of the action, resource type or condition key."
+    ),
+    db_path: str = "iam.db",
+    kind: Kind = typer.Option(Kind.action, help="What to look up."),
+    prefix: Optional[str] = typer.Option(None, help="Only entries of this service."),
+    access_level: Optional[str] = typer.Option(
+        None, help="Only actions with this access level, e.g. Write."
+    ),
+    search: Optional[str] = typer.Option(
+        None, help="Free text searched for in names and descriptions."
+    ),
+    rank: bool = typer.Option(False, help="Order search results by relevance."),
+    closure: bool = typer.Option(
+        False, help="List every action needed to call the action, at any depth."
+    ),
+    limit: Optional[int] = typer.Option(None, help="Maximum number of results."),
+):
+    """Looks up actions, resource types and condition keys."""
+    from aws_iam_db import query as iam_query
+
+    connection = iam_query.connect(db_path)
+    if search is not None:
+        results = iam_query.search(connection, search, kind.value, limit, rank)
+    elif kind == Kind.action and name is not None:
+        if closure:
+            results = iam_query.get_action_closure(connection, name)
+        else:
+            results = iam_query.get_action(connection, name)
+        if results is None:
+            typer.echo(f"No action named {name}", err=True)
+            raise typer.Exit(1)
+    elif kind == Kind.action:
+        results = iam_query.find_actions(connection, prefix, access_level, limit)
+    elif kind == Kind.resource:
+        results = iam_query.find_resources(connection, name, prefix, limit)
+    else:
+        results = iam_query.find_conditions(connection, name, prefix, limit)
+    typer.echo(json.dumps(results, indent=2))
 
-def run(json_path: str = "/tmp/actions_data.json", db_path: str = "iam.db"):
-    get_docs(json_path)
-    init(json_path, db_path)
+
+@app.command()
+def expand(
+    patterns: List[str] = typer.Argument(..., help="Action patterns, e.g. s3:Get*."),
+    db_path: str = "iam.db",
+):
+    """Expands IAM action wildcards to the actions they match."""
+    from aws_iam_db.expand import ActionIndex
+
+    index = ActionIndex.from_database(db_path)
+    typer.echo(json.dumps(index.expand_many(patterns), indent=2))
+
+
+@app.command()
+def analyze(
+    policies: str = typer.Argument(
+        ..., help="Directory of policy .json files, or an NDJSON file (- for stdin)."
+    ),
+    db_path: str = "iam.db",
+    actions: bool = typer.Option(True, help="List the allowed actions of each policy."),
+):
+    """Reports the effective actions of IAM policies."""
+    from aws_iam_db.analyze import PolicyAnalyzer, load_policies
+
+    analyzer = PolicyAnalyzer.from_database(db_path)
+    for report in analyzer.analyze_many(load_policies(policies), actions):
+        typer.echo(json.dumps(report))
+
+
+@app.command()
+def match(
+    arns: List[str] = typer.Argument(
+        ..., help="ARNs, or - to read one ARN per line from stdin."
+    ),
+    db_path: str = "iam.db",
+    actions: bool = typer.Option(
+        True, help="List the actions and condition keys of each resource type."
+    ),
+):
+    """Finds the resource types that concrete ARNs are instances of."""
+    import sys
+
+    from aws_iam_db.arn import ArnMatcher
+
+    matcher = ArnMatcher.from_database(db_path)
+    if arns == ["-"]:
+        arns = (line.strip() for line in sys.stdin if line.strip())
+    fields = ("prefix", "name", "arn", "condition_keys", "actions")
+    if not actions:
+        fields = fields[:3]
+    for arn in arns:
+        resource_types = [
+            {field: resource_type[field] for field in fields}
+            for resource_type in matcher.match(arn)
+        ]
+        typer.echo(json.dumps({"arn": arn, "resource_types": resource_types}))
+
+
+@app.command()
+def snapshot(
+    snapshot_path: str = typer.Argument("iam.snapshot", help="File to write."),
+    db_path: str = "iam.db",
+):
+    """Exports the database to a compact read-only snapshot file."""
+    from aws_iam_db.snapshot import export_snapshot
+
+    export_snapshot(db_path, snapshot_path)
+
+
+@app.command()
+def export(
+    directory: str = typer.Argument("iam-export", help="Directory to write to."),
+    db_path: str = "iam.db",
+    format: ExportFormat = typer.Option(
+        ExportFormat.parquet, help="Parquet, or Arrow IPC files."
+    ),
+):
+    """Exports every table to a columnar file, for pandas or DuckDB."""
+    from aws_iam_db.export import export_database
+
+    for table, path in export_database(db_path, directory, format.value).items():
+        typer.echo(f"{table:20} {path}")
+
+
+@app.command()
+def diff(
+    old_db_path: str = typer.Argument(..., help="Database of the earlier build."),
+    new_db_path: str = typer.Argument(..., help="Database of the later build."),
+):
+    """Lists what was added, removed or changed between two builds."""
+    from aws_iam_db.diff import diff_databases
+
+    typer.echo(json.dumps(diff_databases(old_db_path, new_db_path), indent=2))
+
+
+@app.command()
+def serve(
+    db_path: str = "iam.db",
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    workers: int = typer.Option(8, help="Threads, and connections, answering lookups."),
+    cache_size: int = typer.Option(10000, help="Responses kept in the LRU cache."),
+):
+    """Serves read-only lookups over HTTP as JSON."""
+    from aws_iam_db.serve import serve
+
+    typer.echo(f"Serving {db_path} on http://{host}:{port}/", err=True)
+    serve(db_path, host, port, workers, cache_size)
 
 
 def main():
-    typer.run(run)
+    app()
+
+
+if __name__ == "__main__":
+    main()
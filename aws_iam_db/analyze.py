@@ -0,0 +1,217 @@
+"""Batch analysis of IAM policy documents.
+
+Every action gets a dense integer id, its position in ActionIndex order, and sets
+of actions are represented as bitsets held in Python ints. Resolving Allow, Deny
+and NotAction, counting actions per access level and finding missing dependent
+actions then come down to a few bitwise operations per statement. These run in
+C over the whole set instead of looping over Python sets of strings.
+"""
+
+from functools import lru_cache
+import json
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from aws_iam_db import query
+from aws_iam_db.expand import ActionIndex
+
+
+def _bitset(ids: Iterable[int], size: int) -> int:
+    """Builds the bitset with the given bits set, in linear time"""
+    buffer = bytearray((size + 7) // 8)
+    for i in ids:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, "little")
+
+
+# The positions of the set bits of every byte value
+_BYTE_BITS = tuple(tuple(i for i in range(8) if value >> i & 1) for value in range(256))
+
+
+def _bit_ids(bits: int) -> List[int]:
+    """The positions of the set bits, lowest first"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    return [
+        offset << 3 | i
+        for offset, byte in enumerate(data)
+        if byte
+        for i in _BYTE_BITS[byte]
+    ]
+
+
+def popcount(bits: int) -> int:
+    try:
+        return bits.bit_count()
+    except AttributeError:  # Python < 3.10
+        return bin(bits).count("1")
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+class PolicyAnalyzer:
+    """Computes the effective actions of IAM policies over a fixed set of actions"""
+
+    def __init__(
+        self,
+        index: ActionIndex,
+        access_levels: Dict[str, str],
+        dependencies: Dict[str, List[str]],
+    ):
+        self.index = index
+        self.actions = index.expand("*")
+        self.ids = {action.lower(): i for i, action in enumerate(self.actions)}
+        size = len(self.actions)
+        self.all = (1 << size) - 1
+
+        ids_by_level: Dict[str, List[int]] = {}
+        for action, level in access_levels.items():
+            if action.lower() in self.ids:
+                ids_by_level.setdefault(level, []).append(self.ids[action.lower()])
+        self.access_levels = {
+            level: _bitset(ids, size) for level, ids in sorted(ids_by_level.items())
+        }
+
+        # The dependent actions of each action as a bitset of only the bytes they
+        # span, the offsets of those bytes, and the names the bits decode to:
+        # dependencies are mostly a few actions of one service, so testing them
+        # all takes one small int operation. Dependent actions that are not
+        # documented actions themselves are ignored
+        self.dependencies: Dict[int, Tuple[int, int, int, List[str]]] = {}
+        for action, dependents in dependencies.items():
+            dependent_ids = [
+                self.ids[name.lower()]
+                for name in dependents
+                if name.lower() in self.ids
+            ]
+            if action.lower() in self.ids and dependent_ids:
+                start = min(dependent_ids) >> 3
+                end = (max(dependent_ids) >> 3) + 1
+                bits = _bitset(
+                    (i - (start << 3) for i in dependent_ids), (end - start) << 3
+                )
+                names = [self.actions[i] for i in sorted(set(dependent_ids))]
+                self.dependencies[self.ids[action.lower()]] = (start, end, bits, names)
+        self.has_dependencies = _bitset(self.dependencies, size)
+        self.pattern_bits = lru_cache(maxsize=65536)(self._pattern_bits)
+
+    @classmethod
+    def from_database(cls, db_path: str) -> "PolicyAnalyzer":
+        connection = query.connect(db_path)
+        try:
+            access_levels = dict(
+                connection.execute("SELECT name, access_level FROM action")
+            )
+            dependencies: Dict[str, List[str]] = {}
+            for action, dependent in connection.execute(
+                "SELECT a.name, d.name FROM dependent_action d"
+                " JOIN action a ON a.id = d.action_id ORDER BY d.id"
+            ):
+                dependencies.setdefault(action, []).append(dependent)
+        finally:
+            connection.close()
+        return cls(ActionIndex(access_levels), access_levels, dependencies)
+
+    def _pattern_bits(self, pattern: str) -> int:
+        ids = self.ids
+        return _bitset(
+            (ids[action.lower()] for action in self.index.expand(pattern)),
+            len(self.actions),
+        )
+
+    def statement_bits(self, statement: dict) -> int:
+        """The actions a statement applies to, with NotAction resolved"""
+        bits = 0
+        for pattern in _as_list(statement.get("Action", statement.get("NotAction"))):
+            bits |= self.pattern_bits(pattern)
+        if "NotAction" in statement:
+            bits = self.all & ~bits
+        return bits
+
+    def allowed(self, policy: dict) -> int:
+        """Bitset of the actions a policy document allows.
+
+        Allow statements count whatever their resources and conditions. A Deny
+        statement only removes actions when it applies to every resource without
+        conditions, since otherwise the actions stay allowed in some cases."""
+        allowed = denied = 0
+        for statement in _as_list(policy.get("Statement")):
+            if statement.get("Effect") == "Allow":
+                allowed |= self.statement_bits(statement)
+            elif (
+                statement.get("Effect") == "Deny"
+                and not statement.get("Condition")
+                and "NotResource" not in statement
+                and "*" in _as_list(statement.get("Resource", "*"))
+            ):
+                denied |= self.statement_bits(statement)
+        return allowed & ~denied
+
+    def missing_dependencies(self, allowed: int) -> Dict[str, List[str]]:
+        """Dependent actions of allowed actions that the policy does not allow,
+        in ActionIndex order"""
+        # Each action's dependencies are tested against the same bytes of a copy
+        # of allowed at once, bits are only decoded when some are allowed
+        data = allowed.to_bytes(len(self.actions) // 8 + 1, "little")
+        actions = self.actions
+        dependencies = self.dependencies
+        missing = {}
+        for i in _bit_ids(allowed & self.has_dependencies):
+            start, end, bits, names = dependencies[i]
+            lacking = bits & ~int.from_bytes(data[start:end], "little")
+            if lacking == bits:
+                missing[actions[i]] = list(names)
+            elif lacking:
+                offset = start << 3
+                missing[actions[i]] = [actions[offset + j] for j in _bit_ids(lacking)]
+        return missing
+
+    def analyze(self, policy: dict, list_actions: bool = True) -> dict:
+        allowed = self.allowed(policy)
+        report = {
+            "allowed": popcount(allowed),
+            "access_levels": {
+                level: popcount(allowed & bits)
+                for level, bits in self.access_levels.items()
+            },
+            "missing_dependent_actions": self.missing_dependencies(allowed),
+        }
+        if list_actions:
+            report["actions"] = [self.actions[i] for i in _bit_ids(allowed)]
+        return report
+
+    def analyze_many(
+        self, policies: Iterable[Tuple[str, dict]], list_actions: bool = True
+    ) -> Iterator[dict]:
+        for name, policy in policies:
+            yield dict(name=name, **self.analyze(policy, list_actions))
+
+
+def _document(name: str, data: dict) -> Tuple[str, dict]:
+    """Accepts a bare policy document or {"name": ..., "document": {...}}"""
+    if "document" in data:
+        return data.get("name", name), data["document"]
+    return name, data
+
+
+def load_policies(path: str) -> Iterator[Tuple[str, dict]]:
+    """Yields (name, policy document) pairs from a directory of .json files, or
+    from an NDJSON file with one policy per line ("-" reads standard input)"""
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            if filename.endswith(".json"):
+                with open(os.path.join(path, filename), "r") as policy_file:
+                    yield _document(filename, json.load(policy_file))
+        return
+    policy_file = sys.stdin if path == "-" else open(path, "r")
+    try:
+        for number, line in enumerate(policy_file, 1):
+            if line.strip():
+                yield _document(f"line {number}", json.loads(line))
+    finally:
+        if policy_file is not sys.stdin:
+            policy_file.close()
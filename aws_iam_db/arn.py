@@ -0,0 +1,155 @@
+"""Matching of concrete ARNs to the resource types whose ARN template they fit.
+
+Templates such as arn:${Partition}:s3:::${BucketName}/${ObjectName} are compiled
+once into regular expressions and indexed by service and by the head of their
+resource path, the literal before its first "/" or ":" (here none, while
+arn:${Partition}:ec2:${Region}:${Account}:instance/${InstanceId} has "instance").
+A concrete ARN is only tried against the templates sharing its service and head,
+plus those of its service whose resource path starts with a placeholder, so a
+lookup stays a handful of regex matches however many templates there are.
+
+Placeholders in the resource path match one or more characters other than ":"
+and "/", so the template of a DynamoDB table does not also match the ARNs of its
+indexes, table/${TableName}/index/${IndexName}. Only placeholders whose values
+are paths, like ${RoleNameWithPath}, the ${Path}${RoleName} of IAM roles or
+${LogGroupName}, also match "/", and a trailing ${ObjectName}, as S3 object keys
+may contain anything, matches the rest of the ARN. In the partition, region and
+account fields placeholders match any value, including an empty one.
+"""
+
+from functools import lru_cache
+from operator import itemgetter
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aws_iam_db import query
+
+_PLACEHOLDER = re.compile(r"(?:\$\{[^}]*\})+")
+# Placeholders whose values are paths, which may contain "/"
+_PATH_PLACEHOLDER = re.compile(r"\$\{(?:LogGroupName|[^}]*Path)\}")
+_SEPARATOR = re.compile("[/:]")
+
+
+def _head(resource: str) -> str:
+    """The part of a resource path before its first separator"""
+    return _SEPARATOR.split(resource, 1)[0]
+
+
+def _field_pattern(field: str) -> str:
+    return "[^:]*".join(re.escape(part) for part in _PLACEHOLDER.split(field))
+
+
+def compile_template(template: str) -> Optional["re.Pattern"]:
+    """Compiles an ARN template, or returns None if it is not an ARN"""
+    fields = template.split(":", 5)
+    if len(fields) != 6 or fields[0] != "arn":
+        return None
+    header = ":".join(_field_pattern(field) for field in fields[:5])
+    resource = fields[5]
+    parts = []
+    position = 0
+    for placeholder in _PLACEHOLDER.finditer(resource):
+        parts.append(re.escape(resource[position : placeholder.start()]))
+        if (
+            placeholder.end() == len(resource)
+            and "${ObjectName}" in placeholder.group()
+        ):
+            parts.append(".+")
+        elif _PATH_PLACEHOLDER.search(placeholder.group()):
+            parts.append("[^:]+")
+        else:
+            parts.append("[^:/]+")
+        position = placeholder.end()
+    parts.append(re.escape(resource[position:]))
+    return re.compile(header + ":" + "".join(parts), re.DOTALL)
+
+
+class ArnMatcher:
+    """In-memory index of ARN templates answering which resource types an ARN is"""
+
+    def __init__(self, resource_types: Iterable[dict], cache_size: int = 65536):
+        """`resource_types` are dicts with at least "prefix", "name" and "arn", the
+        template. Matches return these same dicts, so they must not be modified."""
+        # Per (service, head): (literal length, pattern, resource type). A head of
+        # None holds the templates whose resource path starts with a placeholder.
+        index: Dict[tuple, List[tuple]] = {}
+        self.templates = 0
+        for resource_type in resource_types:
+            template = resource_type["arn"]
+            pattern = compile_template(template)
+            if pattern is None:
+                continue
+            self.templates += 1
+            service, resource = template.split(":", 5)[2::3]
+            head = _head(resource)
+            if _PLACEHOLDER.search(head):
+                head = None
+            literal = len(_PLACEHOLDER.sub("", template))
+            index.setdefault((service, head), []).append(
+                (literal, pattern, resource_type)
+            )
+        self._index = {key: tuple(items) for key, items in index.items()}
+        self._cached_match = lru_cache(maxsize=cache_size)(self._match)
+
+    @classmethod
+    def from_database(cls, db_path: str, cache_size: int = 65536) -> "ArnMatcher":
+        """Loads every resource type with its condition keys and the actions that
+        can be granted on it"""
+        connection = query.connect(db_path)
+        try:
+            resource_types = {
+                row["id"]: {
+                    "prefix": row["prefix"],
+                    "name": row["name"],
+                    "arn": row["arn"],
+                    "condition_keys": [],
+                    "actions": [],
+                }
+                for row in connection.execute(
+                    "SELECT r.id, s.prefix, r.name, r.arn FROM resource r"
+                    " JOIN service s ON s.id = r.service_id ORDER BY r.id"
+                )
+            }
+            for resource_id, name in connection.execute(
+                "SELECT rc.resource_id, c.name FROM resource_condition rc"
+                " JOIN condition c ON c.id = rc.condition_id ORDER BY c.id"
+            ):
+                resource_types[resource_id]["condition_keys"].append(name)
+            for resource_id, name in connection.execute(
+                "SELECT ar.resource_id, a.name FROM action_resource ar"
+                " JOIN action a ON a.id = ar.action_id ORDER BY a.name"
+            ):
+                resource_types[resource_id]["actions"].append(name)
+        finally:
+            connection.close()
+        return cls(resource_types.values(), cache_size)
+
+    def __len__(self) -> int:
+        return self.templates
+
+    def _match(self, arn: str) -> Tuple[dict, ...]:
+        fields = arn.split(":", 5)
+        if len(fields) != 6:
+            return ()
+        service = fields[2]
+        index = self._index
+        matches = []
+        for head in (_head(fields[5]), None):
+            for literal, pattern, resource_type in index.get((service, head), ()):
+                if pattern.fullmatch(arn):
+                    matches.append((-literal, len(matches), resource_type))
+        matches.sort(key=itemgetter(0, 1))
+        return tuple(resource_type for _, _, resource_type in matches)
+
+    def match(self, arn: str) -> Tuple[dict, ...]:
+        """Returns the resource types whose template matches a concrete ARN,
+        those with the most literal text first"""
+        return self._cached_match(arn)
+
+    def match_many(self, arns: Iterable[str]) -> Dict[str, Tuple[dict, ...]]:
+        """Matches a batch of ARNs, returning the resource types of each"""
+        match = self._cached_match
+        return {arn: match(arn) for arn in arns}
+
+    def cache_info(self):
+        return self._cached_match.cache_info()
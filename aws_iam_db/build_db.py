@@ -1,33 +1,79 @@
+from contextlib import nullcontext
+import hashlib
+from itertools import count
 import json
-from typing import Tuple
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from sqlalchemy.engine import create_engine
-from sqlalchemy.engine.base import Engine
+from sqlalchemy.engine.base import Connection, Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, Index, MetaData
+from sqlalchemy import bindparam, exists, func, inspect, or_, select, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm.session import Session
 from sqlalchemy.sql.schema import ForeignKey, Table
 
 import typer
 
+from aws_iam_db.metrics import Metrics
+from aws_iam_db.query import SEARCH_TABLES
 
 Base = declarative_base()  # pylint: disable=invalid-name
 
 action_resource_table = Table(
     "action_resource",
     Base.metadata,
-    Column("action_id", Integer, ForeignKey("action.id")),
-    Column("resource_id", Integer, ForeignKey("resource.id")),
+    Column("action_id", Integer, ForeignKey("action.id"), index=True),
+    Column("resource_id", Integer, ForeignKey("resource.id"), index=True),
 )
 
 resource_condition_table = Table(
     "resource_condition",
     Base.metadata,
-    Column("resource_id", Integer, ForeignKey("resource.id")),
-    Column("condition_id", Integer, ForeignKey("condition.id")),
+    Column("resource_id", Integer, ForeignKey("resource.id"), index=True),
+    Column("condition_id", Integer, ForeignKey("condition.id"), index=True),
 )
 
+# Every action reachable from an action through its dependent actions, with the
+# length of the shortest chain of dependencies leading to it. Materialized by
+# build_action_closure once all services are loaded.
+action_closure_table = Table(
+    "action_closure",
+    Base.metadata,
+    Column("action_id", Integer, ForeignKey("action.id"), primary_key=True),
+    Column("dependent_id", Integer, ForeignKey("action.id"), primary_key=True),
+    Column("depth", Integer),
+)
+
+# Full-text index over names and descriptions. It is an FTS5 virtual table, so it
+# is created by create_search_index rather than create_all, and the rowid of each
+# entry encodes the table and id of the row it was built from, see search_rowid.
+search_table = Table(
+    "search",
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("name", String()),
+    Column("description", String()),
+)
+
+
+class Service(Base):
+    """SQLAlchemy Declarative configuration for the Services table"""
+
+    __tablename__ = "service"
+    id = Column(Integer, primary_key=True)
+    name = Column(String(), index=True)
+    prefix = Column(String(), index=True)
+    content_hash = Column(String())
+    actions = relationship("Action")
+    resources = relationship("Resource")
+    conditions = relationship("Condition")
+
+    def __repr__(self):
+        return "<Service(name='%s', prefix='%s')>" % (self.name, self.prefix)
+
 
 class DependentAction(Base):
     """SQLAlchemy Declarative configuration for the Dependent Actions table"""
@@ -35,9 +81,12 @@ class DependentAction(Base):
     __tablename__ = "dependent_action"
 
     id = Column(Integer, primary_key=True)
-    action_id = Column(Integer, ForeignKey("action.id"))
+    action_id = Column(Integer, ForeignKey("action.id"), index=True)
     name = Column(String())
     resource = Column(String())
+    # The action named by `name`, resolved by build_action_closure. NULL when no
+    # documented action has that name.
+    dependent_id = Column(Integer, ForeignKey("action.id"), index=True)
 
     def __repr__(self):
         return "<DependentAction(name='%s', resource='%s')>" % (
@@ -51,11 +100,20 @@ class Action(Base):
 
     __tablename__ = "action"
     id = Column(Integer, primary_key=True)
-    name = Column(String(), index=True)
+    service_id = Column(Integer, ForeignKey("service.id"), index=True)
+    # IAM action names are case-insensitive, NOCASE also lets LIKE 'prefix%' use the index
+    name = Column(String(collation="NOCASE"), index=True)
     description = Column(String())
     access_level = Column(String(), index=True)
     resources = relationship("Resource", secondary=action_resource_table)
-    dependent_actions = relationship("DependentAction")
+    # Cover the access level lookups, alone (ordered by name) or within a service
+    __table_args__ = (
+        Index("ix_action_access_level_name", "access_level", "name"),
+        Index("ix_action_service_id_access_level", "service_id", "access_level"),
+    )
+    dependent_actions = relationship(
+        "DependentAction", foreign_keys="DependentAction.action_id"
+    )
 
     def __repr__(self):
         return "<Action(name='%s', description='%s', access_level='%s')>" % (
@@ -70,7 +128,8 @@ class Resource(Base):
 
     __tablename__ = "resource"
     id = Column(Integer, primary_key=True)
-    name = Column(String())
+    service_id = Column(Integer, ForeignKey("service.id"), index=True)
+    name = Column(String(), index=True)
     arn = Column(String())
     required = Column(Boolean())
     condition_keys = relationship(
@@ -86,7 +145,8 @@ class Condition(Base):
 
     __tablename__ = "condition"
     id = Column(Integer, primary_key=True)
-    name = Column(String())
+    service_id = Column(Integer, ForeignKey("service.id"), index=True)
+    name = Column(String(collation="NOCASE"), index=True)
     description = Column(String())
     type = Column(String())
     resources = relationship(
@@ -102,15 +162,27 @@ class Condition(Base):
 
 
 def create_database(db_session: Session, json_data: list):
+    """Loads the IAM data through the ORM, one object at a time.
+
+    Resource types and condition keys are looked up by name across every service,
+    so shared names also link rows of other services. Builds use BulkLoader, this
+    is the reference tests/test_build_db.py compares it against."""
     with typer.progressbar(json_data, label="Creating database") as progress:
         for row in progress:
             # 'conditions', 'prefix', 'privileges', 'resources', 'service_name'
+            new_service = Service(
+                name=row["service_name"],
+                prefix=row["prefix"],
+                content_hash=service_hash(row),
+            )
+            db_session.add(new_service)
             for cond in row["conditions"]:
                 new_cond = Condition(
                     name=cond["condition"],
                     description=cond["description"],
                     type=cond["type"],
                 )
+                new_service.conditions.append(new_cond)
                 db_session.add(new_cond)
             for res in row["resources"]:
                 new_res = Resource(
@@ -118,6 +190,7 @@ def create_database(db_session: Session, json_data: list):
                     arn=res["arn"].rstrip("*"),
                     required=res["arn"].endswith("*"),
                 )
+                new_service.resources.append(new_res)
                 if len(res["condition_keys"]) > 0:
                     conditions = (
                         db_session.query(Condition)
@@ -154,19 +227,475 @@ def create_database(db_session: Session, json_data: list):
                     resources=resources,
                     dependent_actions=dep_actions,
                 )
+                new_service.actions.append(new_priv)
                 db_session.add(new_priv)
     db_session.commit()
     typer.echo("Database created!")
 
 
+def search_rowid(table_name: str, row_id):
+    """Rowid of the search entry for a row of one of SEARCH_TABLES. Works on ints
+    and on SQL column expressions alike."""
+    return row_id * len(SEARCH_TABLES) + SEARCH_TABLES.index(table_name)
+
+
+def create_search_index(engine: Engine) -> bool:
+    """Creates the FTS5 search table, returns False when SQLite lacks FTS5"""
+    try:
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_table.name} "
+                    "USING fts5(name, description, tokenize='porter unicode61')"
+                )
+            )
+    except OperationalError:
+        typer.echo("SQLite was built without FTS5, skipping the search index")
+        return False
+    return True
+
+
+def service_hash(service: dict) -> str:
+    """Content hash of a service schema, used to tell which services changed"""
+    canonical = json.dumps(service, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def build_action_closure(
+    connection: Connection, metrics: Optional[Metrics] = None
+) -> int:
+    """Resolves dependent action names to action ids and materializes the
+    transitive closure of the dependencies into action_closure.
+
+    Dependencies cross services, so this runs over the whole database once its
+    services are loaded. Only rows that are unresolved, or point at a deleted
+    action, are resolved again, and only closure rows that differ from the
+    current ones are written, so after an update the writes follow the size of
+    the change. Returns the number of rows in action_closure."""
+    metrics = metrics or Metrics()
+    start = time.perf_counter()
+    target = Action.__table__.alias("target")
+    connection.execute(
+        DependentAction.__table__.update()
+        .where(
+            or_(
+                DependentAction.dependent_id.is_(None),
+                ~exists().where(target.c.id == DependentAction.dependent_id),
+            )
+        )
+        .values(
+            dependent_id=select(Action.id)
+            .where(Action.name == DependentAction.name)
+            .limit(1)
+            .scalar_subquery()
+        )
+    )
+    edges = sorted(
+        connection.execute(
+            select(DependentAction.action_id, DependentAction.dependent_id)
+            .where(DependentAction.dependent_id.is_not(None))
+            .distinct()
+        )
+    )
+    # Adjacency array over dense node numbers: the dependents of node i are
+    # targets[offsets[i]:offsets[i + 1]]
+    ids = sorted({action_id for edge in edges for action_id in edge})
+    node = {action_id: i for i, action_id in enumerate(ids)}
+    offsets = [0] * (len(ids) + 1)
+    for action_id, _ in edges:
+        offsets[node[action_id] + 1] += 1
+    for i in range(len(ids)):
+        offsets[i + 1] += offsets[i]
+    targets = [node[dependent_id] for _, dependent_id in edges]
+
+    # Breadth-first from every action with dependencies, so each dependent is
+    # reached first along a shortest chain. seen[j] == i marks j as visited from i.
+    rows = []
+    seen = [-1] * len(ids)
+    for i in range(len(ids)):
+        if offsets[i] == offsets[i + 1]:
+            continue
+        seen[i] = i
+        frontier = [i]
+        depth = 0
+        while frontier:
+            depth += 1
+            next_frontier = []
+            for j in frontier:
+                for k in targets[offsets[j] : offsets[j + 1]]:
+                    if seen[k] != i:
+                        seen[k] = i
+                        next_frontier.append(k)
+            rows.extend((ids[i], ids[k], depth) for k in next_frontier)
+            frontier = next_frontier
+
+    closure = set(rows)
+    current = set(connection.execute(select(action_closure_table)))
+    stale = current - closure
+    added = closure - current
+    if stale:
+        connection.execute(
+            action_closure_table.delete().where(
+                action_closure_table.c.action_id == bindparam("old_action_id"),
+                action_closure_table.c.dependent_id == bindparam("old_dependent_id"),
+            ),
+            [
+                {"old_action_id": action_id, "old_dependent_id": dependent_id}
+                for action_id, dependent_id, _ in stale
+            ],
+        )
+    if added:
+        connection.execute(
+            action_closure_table.insert(),
+            [
+                {"action_id": action_id, "dependent_id": dependent_id, "depth": depth}
+                for action_id, dependent_id, depth in added
+            ],
+        )
+    metrics.add_rows(
+        action_closure_table.name,
+        len(stale) + len(added),
+        time.perf_counter() - start,
+    )
+    return len(closure)
+
+
+class BulkLoader:
+    """Inserts services with batched Core executemany statements on one connection.
+
+    Unlike create_database, ids are assigned up front and resource types and
+    condition keys are resolved through per-service name maps, so no SELECTs are
+    issued and names are never matched against another service's rows."""
+
+    tables = [
+        Service.__table__,
+        Action.__table__,
+        Resource.__table__,
+        Condition.__table__,
+        DependentAction.__table__,
+        action_resource_table,
+        resource_condition_table,
+    ]
+
+    def __init__(self, connection: Connection, metrics: Optional[Metrics] = None):
+        self.connection = connection
+        self.metrics = metrics or Metrics()
+        if inspect(connection).has_table(search_table.name):
+            self.tables = self.tables + [search_table]
+        self.pending = {table: [] for table in self.tables}
+        self.next_id = {
+            table: count(
+                (connection.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+            )
+            for table in self.tables[:5]
+        }
+
+    def _new_id(self, model) -> int:
+        return next(self.next_id[model.__table__])
+
+    def _index(self, table_name: str, row_id: int, name: str, description: str):
+        if search_table in self.pending:
+            self.pending[search_table].append(
+                {
+                    "rowid": search_rowid(table_name, row_id),
+                    "name": name,
+                    "description": description,
+                }
+            )
+
+    def add_service(self, row: dict, content_hash: Optional[str] = None):
+        # 'conditions', 'prefix', 'privileges', 'resources', 'service_name'
+        pending = self.pending
+        service_id = self._new_id(Service)
+        pending[Service.__table__].append(
+            {
+                "id": service_id,
+                "name": row["service_name"],
+                "prefix": row["prefix"],
+                "content_hash": content_hash or service_hash(row),
+            }
+        )
+        condition_ids: Dict[str, List[int]] = {}
+        for cond in row["conditions"]:
+            cond_id = self._new_id(Condition)
+            condition_ids.setdefault(cond["condition"], []).append(cond_id)
+            pending[Condition.__table__].append(
+                {
+                    "id": cond_id,
+                    "service_id": service_id,
+                    "name": cond["condition"],
+                    "description": cond["description"],
+                    "type": cond["type"],
+                }
+            )
+            self._index("condition", cond_id, cond["condition"], cond["description"])
+        resource_ids: Dict[str, List[int]] = {}
+        for res in row["resources"]:
+            res_id = self._new_id(Resource)
+            resource_ids.setdefault(res["resource"], []).append(res_id)
+            pending[Resource.__table__].append(
+                {
+                    "id": res_id,
+                    "service_id": service_id,
+                    "name": res["resource"],
+                    "arn": res["arn"].rstrip("*"),
+                    "required": res["arn"].endswith("*"),
+                }
+            )
+            self._index("resource", res_id, res["resource"], res["arn"].rstrip("*"))
+            for name in dict.fromkeys(res["condition_keys"]):
+                pending[resource_condition_table].extend(
+                    {"resource_id": res_id, "condition_id": cond_id}
+                    for cond_id in condition_ids.get(name, ())
+                )
+        for priv in row["privileges"]:
+            action_id = self._new_id(Action)
+            pending[Action.__table__].append(
+                {
+                    "id": action_id,
+                    "service_id": service_id,
+                    "name": f"{row['prefix']}:{priv['privilege']}",
+                    "description": priv["description"],
+                    "access_level": priv["access_level"],
+                }
+            )
+            self._index(
+                "action",
+                action_id,
+                f"{row['prefix']}:{priv['privilege']}",
+                priv["description"],
+            )
+            resource_names = [
+                res["resource_type"].rstrip("*") for res in priv["resource_types"]
+            ]
+            for name in dict.fromkeys(resource_names):
+                pending[action_resource_table].extend(
+                    {"action_id": action_id, "resource_id": res_id}
+                    for res_id in resource_ids.get(name, ())
+                )
+            for res_type in priv["resource_types"]:
+                pending[DependentAction.__table__].extend(
+                    {
+                        "id": self._new_id(DependentAction),
+                        "action_id": action_id,
+                        "name": act,
+                        "resource": res_type["resource_type"].rstrip("*"),
+                    }
+                    for act in res_type["dependent_actions"]
+                )
+
+    def delete_service(self, service_id: int):
+        """Deletes a service and every row that belongs to it"""
+        action_ids = select(Action.id).where(Action.service_id == service_id)
+        resource_ids = select(Resource.id).where(Resource.service_id == service_id)
+        if search_table in self.pending:
+            for model in (Action, Resource, Condition):
+                rowids = select(search_rowid(model.__tablename__, model.id)).where(
+                    model.service_id == service_id
+                )
+                self.connection.execute(
+                    search_table.delete().where(search_table.c.rowid.in_(rowids))
+                )
+        for statement in (
+            action_resource_table.delete().where(
+                action_resource_table.c.action_id.in_(action_ids)
+            ),
+            DependentAction.__table__.delete().where(
+                DependentAction.action_id.in_(action_ids)
+            ),
+            resource_condition_table.delete().where(
+                resource_condition_table.c.resource_id.in_(resource_ids)
+            ),
+            Action.__table__.delete().where(Action.service_id == service_id),
+            Resource.__table__.delete().where(Resource.service_id == service_id),
+            Condition.__table__.delete().where(Condition.service_id == service_id),
+            Service.__table__.delete().where(Service.id == service_id),
+        ):
+            self.connection.execute(statement)
+
+    @property
+    def pending_rows(self) -> int:
+        return sum(len(batch) for batch in self.pending.values())
+
+    def flush(self):
+        for table in self.tables:
+            if self.pending[table]:
+                start = time.perf_counter()
+                self.connection.execute(table.insert(), self.pending[table])
+                self.metrics.add_rows(
+                    table.name, len(self.pending[table]), time.perf_counter() - start
+                )
+                self.pending[table] = []
+
+
+def bulk_create_database(
+    engine: Engine,
+    json_data: Iterable[dict],
+    batch_size: int = 5000,
+    commit_batches: bool = False,
+    progress: bool = True,
+    metrics: Optional[Metrics] = None,
+):
+    """Loads the IAM data with batched Core inserts inside a single transaction.
+
+    `json_data` is consumed one service at a time, so it can be a generator. With
+    `commit_batches` every batch is committed as soon as it is inserted, keeping
+    memory flat while services are still being produced. Time spent loading, but
+    not waiting for services, is added to the "build" stage of `metrics`."""
+    metrics = metrics or Metrics()
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        loader = BulkLoader(connection, metrics)
+        if progress:
+            json_data = typer.progressbar(json_data, label="Creating database")
+        else:
+            json_data = nullcontext(json_data)
+        with json_data as rows:
+            for row in rows:
+                with metrics.timer("build"):
+                    loader.add_service(row)
+                    if loader.pending_rows < batch_size:
+                        continue
+                    loader.flush()
+                    if commit_batches:
+                        transaction.commit()
+                        transaction = connection.begin()
+        with metrics.timer("build"):
+            loader.flush()
+            build_action_closure(connection, metrics)
+            # Gather index statistics so SQLite picks the most selective index
+            connection.execute(text("ANALYZE"))
+            transaction.commit()
+    typer.echo("Database created!")
+
+
+def update_database(
+    engine: Engine,
+    json_data: Iterable[dict],
+    batch_size: int = 5000,
+    progress: bool = True,
+    metrics: Optional[Metrics] = None,
+):
+    """Brings an existing database up to date with the IAM data.
+
+    Only services whose content hash changed are deleted and inserted again, and
+    services that are no longer documented are removed. Everything happens in a
+    single transaction, so readers never see a partially updated database."""
+    metrics = metrics or Metrics()
+    columns = {column["name"] for column in inspect(engine).get_columns("action")}
+    if "service_id" not in columns:
+        raise Exception(
+            "Database was built by an older version without per-service hashes, "
+            "rebuild it from scratch to enable updates"
+        )
+    changed = 0
+    with engine.begin() as connection:
+        # Databases built before the dependency closure lack its column and table
+        dependent_columns = inspect(connection).get_columns("dependent_action")
+        migrate = "dependent_id" not in {column["name"] for column in dependent_columns}
+        if migrate:
+            connection.execute(
+                text(
+                    "ALTER TABLE dependent_action ADD COLUMN dependent_id INTEGER"
+                    " REFERENCES action (id)"
+                )
+            )
+            connection.execute(
+                text(
+                    "CREATE INDEX ix_dependent_action_dependent_id"
+                    " ON dependent_action (dependent_id)"
+                )
+            )
+        action_closure_table.create(connection, checkfirst=True)
+        existing = {
+            name: (service_id, content_hash)
+            for service_id, name, content_hash in connection.execute(
+                select(Service.id, Service.name, Service.content_hash)
+            )
+        }
+        loader = BulkLoader(connection, metrics)
+        if progress:
+            json_data = typer.progressbar(json_data, label="Updating database")
+        else:
+            json_data = nullcontext(json_data)
+        with json_data as rows:
+            for row in rows:
+                with metrics.timer("build"):
+                    content_hash = service_hash(row)
+                    service_id, old_hash = existing.pop(
+                        row["service_name"], (None, None)
+                    )
+                    if old_hash == content_hash:
+                        continue
+                    if service_id is not None:
+                        loader.delete_service(service_id)
+                    loader.add_service(row, content_hash)
+                    changed += 1
+                    if loader.pending_rows >= batch_size:
+                        loader.flush()
+        with metrics.timer("build"):
+            for service_id, _ in existing.values():
+                loader.delete_service(service_id)
+            loader.flush()
+            if changed or existing or migrate:
+                build_action_closure(connection, metrics)
+                connection.execute(text("ANALYZE"))
+    typer.echo(f"Database updated! {changed} services changed, {len(existing)} removed")
+
+
 def connect(db_path: str) -> Tuple[Session, Engine]:
     engine = create_engine(f"sqlite:///{db_path}")
     return Session(engine), engine
 
 
-def init(iam_data_file: str, db_path: str):
-    with open(iam_data_file, "r") as data_file:
-        iam_data = json.load(data_file)
+def load_services(iam_data_file: str) -> Iterator[dict]:
+    """Yields the services in a JSON array file, or line by line from an NDJSON file
+
+    The file is opened right away rather than when the first service is read, so
+    a missing file fails before build touches the database."""
+    return _read_services(open(iam_data_file, "r"))
+
+
+def _read_services(data_file) -> Iterator[dict]:
+    with data_file:
+        first = data_file.read(1)
+        while first.isspace():
+            first = data_file.read(1)
+        data_file.seek(0)
+        if first == "[":
+            yield from json.load(data_file)
+            return
+        for line in data_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def build(
+    services: Iterable[dict],
+    db_path: str,
+    progress: bool = True,
+    update: bool = False,
+    metrics: Optional[Metrics] = None,
+):
+    """Creates the database from services as they are produced, committing in batches.
+
+    With `update` an existing database is updated in place instead, see
+    update_database."""
     session, engine = connect(db_path)
+    if update and inspect(engine).has_table(Action.__tablename__):
+        update_database(engine, services, progress=progress, metrics=metrics)
+        return
     Base.metadata.create_all(engine)
-    create_database(session, iam_data)
+    create_search_index(engine)
+    bulk_create_database(
+        engine, services, commit_batches=True, progress=progress, metrics=metrics
+    )
+
+
+def init(
+    iam_data_file: str,
+    db_path: str,
+    update: bool = False,
+    metrics: Optional[Metrics] = None,
+):
+    build(load_services(iam_data_file), db_path, update=update, metrics=metrics)
@@ -0,0 +1,168 @@
+"""Differences between two databases built by aws-iam-db.
+
+Every service row carries the content hash of its schema, so services whose
+hash is the same in both builds are skipped without reading their rows. For the
+other services each action and condition key is reduced to a hash per field,
+and the two builds are compared with dictionary lookups, in time linear in the
+number of rows of the changed services.
+"""
+
+import hashlib
+import json
+from typing import Dict, Iterable, List, Tuple
+
+from aws_iam_db import query
+
+# Fields of each action and condition key compared between builds
+ACTION_FIELDS = ("description", "access_level", "resources", "dependent_actions")
+CONDITION_FIELDS = ("description", "type")
+
+
+def _digest(value) -> str:
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def _ids(service_ids: Iterable[int]) -> str:
+    return ",".join(str(int(service_id)) for service_id in service_ids)
+
+
+def _services(connection) -> Dict[str, Tuple[int, str]]:
+    return {
+        name: (service_id, content_hash)
+        for service_id, name, content_hash in connection.execute(
+            "SELECT id, name, content_hash FROM service"
+        )
+    }
+
+
+def _action_hashes(connection, service_ids: Iterable[int]) -> Dict[str, tuple]:
+    """Hashes of ACTION_FIELDS for every action of the services, by action name"""
+    ids = _ids(service_ids)
+    conditions: Dict[int, List[str]] = {}
+    for resource_id, name in connection.execute(
+        "SELECT rc.resource_id, c.name FROM resource_condition rc"
+        " JOIN resource r ON r.id = rc.resource_id"
+        " JOIN condition c ON c.id = rc.condition_id"
+        f" WHERE r.service_id IN ({ids})"
+    ):
+        conditions.setdefault(resource_id, []).append(name)
+    resources: Dict[int, list] = {}
+    for action_id, resource_id, name, arn, required in connection.execute(
+        "SELECT ar.action_id, r.id, r.name, r.arn, r.required FROM action_resource ar"
+        " JOIN resource r ON r.id = ar.resource_id"
+        f" WHERE r.service_id IN ({ids})"
+    ):
+        resources.setdefault(action_id, []).append(
+            [name, arn, bool(required), sorted(conditions.get(resource_id, ()))]
+        )
+    dependents: Dict[int, list] = {}
+    for action_id, name, resource in connection.execute(
+        "SELECT d.action_id, d.name, d.resource FROM dependent_action d"
+        " JOIN action a ON a.id = d.action_id"
+        f" WHERE a.service_id IN ({ids})"
+    ):
+        dependents.setdefault(action_id, []).append([name, resource])
+    return {
+        name: (
+            _digest(description),
+            _digest(access_level),
+            _digest(sorted(resources.get(action_id, ()))),
+            _digest(sorted(dependents.get(action_id, ()))),
+        )
+        for action_id, name, description, access_level in connection.execute(
+            "SELECT id, name, description, access_level FROM action"
+            f" WHERE service_id IN ({ids})"
+        )
+    }
+
+
+def _condition_hashes(connection, service_ids: Iterable[int]) -> Dict[tuple, tuple]:
+    """Hashes of CONDITION_FIELDS for every condition key of the services, by
+    (prefix, name), as the same global keys are documented by many services"""
+    return {
+        (prefix, name): (_digest(description), _digest(type_))
+        for prefix, name, description, type_ in connection.execute(
+            "SELECT s.prefix, c.name, c.description, c.type FROM condition c"
+            " JOIN service s ON s.id = c.service_id"
+            f" WHERE c.service_id IN ({_ids(service_ids)})"
+        )
+    }
+
+
+def _compare(old: dict, new: dict, fields: tuple) -> dict:
+    """Added, removed and changed keys, with the fields that changed"""
+    changed = []
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] != new[key]:
+            changed.append(
+                (key, [f for f, a, b in zip(fields, old[key], new[key]) if a != b])
+            )
+    return {
+        "added": sorted(new.keys() - old.keys()),
+        "removed": sorted(old.keys() - new.keys()),
+        "changed": changed,
+    }
+
+
+def diff_databases(old_path: str, new_path: str) -> dict:
+    """Compares two builds, returning the services, actions and condition keys
+    that were added, removed or changed from `old_path` to `new_path`"""
+    old_connection = query.connect(old_path)
+    new_connection = query.connect(new_path)
+    try:
+        old_services = _services(old_connection)
+        new_services = _services(new_connection)
+        # Services only present in one build count as changed with no rows in the
+        # other, so their actions and condition keys show as added or removed
+        differing = [
+            name
+            for name in sorted(old_services.keys() | new_services.keys())
+            if old_services.get(name, (None, None))[1]
+            != new_services.get(name, (None, None))[1]
+        ]
+        old_ids = [old_services[name][0] for name in differing if name in old_services]
+        new_ids = [new_services[name][0] for name in differing if name in new_services]
+        actions = _compare(
+            _action_hashes(old_connection, old_ids),
+            _action_hashes(new_connection, new_ids),
+            ACTION_FIELDS,
+        )
+        conditions = _compare(
+            _condition_hashes(old_connection, old_ids),
+            _condition_hashes(new_connection, new_ids),
+            CONDITION_FIELDS,
+        )
+    finally:
+        old_connection.close()
+        new_connection.close()
+
+    def condition(key: tuple) -> dict:
+        return {"prefix": key[0], "name": key[1]}
+
+    return {
+        "services": {
+            "added": sorted(new_services.keys() - old_services.keys()),
+            "removed": sorted(old_services.keys() - new_services.keys()),
+            "changed": [
+                name
+                for name in differing
+                if name in old_services and name in new_services
+            ],
+        },
+        "actions": {
+            "added": actions["added"],
+            "removed": actions["removed"],
+            "changed": [
+                {"name": name, "fields": fields} for name, fields in actions["changed"]
+            ],
+        },
+        "condition_keys": {
+            "added": [condition(key) for key in conditions["added"]],
+            "removed": [condition(key) for key in conditions["removed"]],
+            "changed": [
+                dict(condition(key), fields=fields)
+                for key, fields in conditions["changed"]
+            ],
+        },
+    }
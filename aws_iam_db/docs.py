@@ -1,25 +1,103 @@
 #!/usr/bin/env python3
 ### adapted from: https://github.com/duo-labs/parliament/blob/main/utils/update_iam_data.py
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+from itertools import islice
+import gzip
+import hashlib
+from importlib.util import find_spec
+import os
 from os import listdir
-from os.path import isfile, join
+from os.path import basename, isfile, join
 import re
 import json
-from bs4.element import PageElement
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Set
+from urllib.parse import urlparse
+from bs4.element import Tag
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
+from urllib3.util.retry import Retry
 
 import typer
 
 from bs4 import BeautifulSoup
 
+from aws_iam_db.metrics import Metrics, timed
+
 # Code for get_links_from_base_actions_resources_conditions_page and update_html_docs_directory borrowed from https://github.com/salesforce/policy_sentry/blob/1126f174f49050b95bddf7549aedaf11fa51a50b/policy_sentry/scraping/awsdocs.py#L31
-BASE_DOCUMENTATION_URL = "https://docs.aws.amazon.com/service-authorization/latest/reference/reference_policies_actions-resources-contextkeys.html"
+DOCS_URL_PREFIX = "https://docs.aws.amazon.com/service-authorization/latest/reference/"
+BASE_DOCUMENTATION_PAGE = "reference_policies_actions-resources-contextkeys.html"
+BASE_DOCUMENTATION_URL = DOCS_URL_PREFIX + BASE_DOCUMENTATION_PAGE
+# HTTP statuses worth retrying, everything else is returned as is
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Stored in the docs directory, records the content hash of each page as last
+# downloaded, which is also the name of its file in the page cache
+MANIFEST_FILENAME = "manifest.json"
+# Bump whenever get_docs output or the cache layout changes, so cached pages and
+# page schemas are downloaded and parsed again
+MANIFEST_VERSION = 3
+# Directory holding the compressed pages, named by the sha256 of their content
+PAGE_CACHE_DIRNAME = "pages"
+# Directory holding the schema parsed from each page
+SCHEMA_CACHE_DIRNAME = "schemas"
+# Default directory for the manifest, the page cache and the schema cache
+DOCS_DIRECTORY = "/tmp/docs/"
+# C-backed parser backends preferred over html.parser when installed, fastest first
+FAST_PARSERS = ("lxml",)
+
+
+class RateLimiter:
+    """Spaces out requests so each host sees at most `requests_per_second`"""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def create_session(
+    pool_size: int = 1, retries: int = 3, backoff_factor: float = 0.5
+) -> requests.Session:
+    """Creates a session whose connection pool is shared by all download workers,
+    retrying failed requests with exponential backoff."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        # Return the last response once retries run out, see download_page
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
-def get_links_from_base_actions_resources_conditions_page() -> list:
+def get_links_from_base_actions_resources_conditions_page(
+    session: Optional[requests.Session] = None,
+    base_url: str = BASE_DOCUMENTATION_URL,
+) -> list:
     """Gets the links from the actions, resources, and conditions keys page, and returns their filenames."""
-    html = requests.get(BASE_DOCUMENTATION_URL)
+    html = (session or requests).get(base_url)
     soup = BeautifulSoup(html.content, "html.parser")
     html_filenames = []
     for i in soup.find("div", {"class": "highlights"}).findAll("a"):
@@ -27,311 +105,581 @@ def get_links_from_base_actions_resources_conditions_page() -> list:
     return html_filenames
 
 
-def update_html_docs_directory(html_docs_destination: str):
+def load_manifest(html_docs_directory: str) -> dict:
+    """Loads the docs manifest, or an empty one if it is missing or out of date.
+
+    Each page entry holds the ETag, Last-Modified and sha256 of the page as last
+    downloaded, and is marked parsed once its schema is in the schema cache."""
+    try:
+        with open(join(html_docs_directory, MANIFEST_FILENAME), "r") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        manifest = {"version": MANIFEST_VERSION, "pages": {}}
+    return manifest
+
+
+def save_manifest(html_docs_directory: str, manifest: dict):
+    manifest_path = join(html_docs_directory, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", "w") as manifest_file:
+        manifest_file.write(json.dumps(manifest, sort_keys=True))
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def page_cache_path(docs_directory: str, sha256: str) -> str:
+    """Where the page with this content hash is stored, gzip compressed"""
+    return join(docs_directory, PAGE_CACHE_DIRNAME, sha256 + ".html.gz")
+
+
+def read_page(path: str) -> str:
+    """Reads a docs page, decompressing it if it comes from the page cache"""
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as page_file:
+            return page_file.read().decode("utf-8")
+    with open(path, "r") as page_file:
+        return page_file.read()
+
+
+def download_page(
+    session: requests.Session,
+    rate_limiter: RateLimiter,
+    url: str,
+    docs_directory: str,
+    entry: Optional[dict] = None,
+    full_refresh: bool = False,
+) -> Optional[dict]:
+    """Downloads a single docs page into the page cache of docs_directory.
+
+    Pages are stored as downloaded, compressed and named by the sha256 of their
+    content, so a page is only written when its content is new. When `entry` is
+    the page's manifest entry a conditional request is sent, unless
+    `full_refresh`. Returns the new manifest entry, which stays marked as parsed
+    when the page is unchanged and not `full_refresh`.
+
+    Failed requests, error and redirect responses are never cached: the page is
+    kept as last downloaded, so a transient error cannot make its service
+    disappear from the docs. A page that was never downloaded is skipped, returning None.
     """
-    Updates the HTML docs from remote location to either (1) local directory
-    (i.e., this repository, or (2) the config directory
-    :return:
+    headers = {}
+    if entry and isfile(page_cache_path(docs_directory, entry["sha256"])):
+        if entry.get("etag") and not full_refresh:
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified") and not full_refresh:
+            headers["If-Modified-Since"] = entry["last_modified"]
+    else:
+        entry = None
+
+    rate_limiter.wait(url)
+    try:
+        response = session.get(url, headers=headers, allow_redirects=False)
+    except requests.RequestException as exception:
+        response, error = None, f"{type(exception).__name__} for {url}"
+    else:
+        if entry and response.status_code == 304:
+            return entry
+        error = f"HTTP {response.status_code} {response.reason} for {url}"
+    if response is None or response.status_code != 200:
+        if entry is None:
+            typer.echo(f"{error}, skipping the page", err=True)
+            return None
+        typer.echo(f"{error}, keeping the page as last downloaded", err=True)
+        return entry
+
+    new_entry = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": hashlib.sha256(response.content).hexdigest(),
+    }
+    if entry and entry.get("sha256") == new_entry["sha256"]:
+        if entry.get("parsed") and not full_refresh:
+            new_entry["parsed"] = True
+        return new_entry
+
+    path = page_cache_path(docs_directory, new_entry["sha256"])
+    if not isfile(path):
+        # Pages with the same content can be downloaded at once by two threads
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as page_file:
+            page_file.write(gzip.compress(response.content, compresslevel=6))
+        os.replace(temporary_path, path)
+    return new_entry
+
+
+def prune_page_cache(docs_directory: str, manifest: dict):
+    """Deletes the cached pages that no manifest entry refers to any more"""
+    used = {entry["sha256"] for entry in manifest["pages"].values()}
+    directory = join(docs_directory, PAGE_CACHE_DIRNAME)
+    for filename in listdir(directory):
+        if not filename.endswith(".html.gz") or filename[:-8] not in used:
+            os.remove(join(directory, filename))
+
+
+def update_html_docs_directory(
+    html_docs_destination: str,
+    workers: int = 1,
+    rate_limit: float = 0.0,
+    url_prefix: str = DOCS_URL_PREFIX,
+    full_refresh: bool = False,
+    metrics: Optional[Metrics] = None,
+) -> dict:
     """
-    link_url_prefix = (
-        "https://docs.aws.amazon.com/service-authorization/latest/reference/"
-    )
-    initial_html_filenames_list = (
-        get_links_from_base_actions_resources_conditions_page()
+    Updates the cached HTML docs in html_docs_destination from the remote location
+    :param workers: number of pages downloaded concurrently over a shared session
+    :param rate_limit: maximum requests per second sent to each host, 0 for no limit
+    :param url_prefix: location the docs are downloaded from
+    :param full_refresh: download and parse every page again, keeping the manifest
+        only to fall back on the cached page when a download fails
+    :param metrics: records the time taken by the whole update and by each page
+    :return: the updated docs manifest, with an entry for every page linked from
+        the base documentation page, except those that failed to download and
+        were never cached
+    """
+    metrics = metrics or Metrics()
+    start = time.perf_counter()
+    Path(html_docs_destination, PAGE_CACHE_DIRNAME).mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(html_docs_destination)
+    session = create_session(pool_size=max(workers, 1))
+    rate_limiter = RateLimiter(rate_limit)
+    initial_html_filenames_list = get_links_from_base_actions_resources_conditions_page(
+        session, url_prefix + BASE_DOCUMENTATION_PAGE
     )
     # Remove the relative path so we can download it
     html_filenames = [sub.replace("./", "") for sub in initial_html_filenames_list]
 
-    with typer.progressbar(html_filenames, label="Downloading aws docs") as progress:
-        for page in progress:
-            response = requests.get(link_url_prefix + page, allow_redirects=False)
-            # Replace the CSS stuff. Basically this:
-            """
-            <link href='href="https://docs.aws.amazon.com/images/favicon.ico"' rel="icon" type="image/ico"/>
-            <link href='href="https://docs.aws.amazon.com/images/favicon.ico"' rel="shortcut icon" type="image/ico"/>
-            <link href='href="https://docs.aws.amazon.com/font/css/font-awesome.min.css"' rel="stylesheet" type="text/css"/>
-            <link href='href="https://docs.aws.amazon.com/css/code/light.css"' id="code-style" rel="stylesheet" type="text/css"/>
-            <link href='href="https://docs.aws.amazon.com/css/awsdocs.css?v=20181221"' rel="stylesheet" type="text/css"/>
-            <link href='href="https://docs.aws.amazon.com/assets/marketing/css/marketing-target.css"' rel="stylesheet" type="text/css"/>
-            list_amazonkendra.html downloaded
-            """
-            soup = BeautifulSoup(response.content, "html.parser")
-            for link in soup.find_all("link"):
-                if link.get("href").startswith("/"):
-                    temp = link.attrs["href"]
-                    link.attrs["href"] = link.attrs["href"].replace(
-                        temp, f"https://docs.aws.amazon.com{temp}"
-                    )
-
-            for script in soup.find_all("script"):
-                try:
-                    if "src" in script.attrs:
-                        if script.get("src").startswith("/"):
-                            temp = script.attrs["src"]
-                            script.attrs["src"] = script.attrs["src"].replace(
-                                temp, f"https://docs.aws.amazon.com{temp}"
-                            )
-                except TypeError as t_e:
-                    print(t_e)
-                    print(script)
-                except AttributeError as a_e:
-                    print(a_e)
-                    print(script)
-
-            with open(html_docs_destination + page, "w") as file:
-                # file.write(str(soup.html))
-                file.write(str(soup.prettify()))
-                file.close()
+    pages = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {
+            executor.submit(
+                timed,
+                download_page,
+                session,
+                rate_limiter,
+                url_prefix + page,
+                html_docs_destination,
+                manifest["pages"].get(page),
+                full_refresh,
+            ): page
+            for page in html_filenames
+        }
+        with typer.progressbar(
+            as_completed(futures), length=len(futures), label="Downloading aws docs"
+        ) as progress:
+            for future in progress:
+                seconds, entry = future.result()
+                metrics.add_page("fetch", futures[future], seconds)
+                if entry is not None:
+                    pages[futures[future]] = entry
+    session.close()
+    # Pages no longer linked from the base page are dropped along with their content
+    manifest["pages"] = pages
+    save_manifest(html_docs_destination, manifest)
+    prune_page_cache(html_docs_destination, manifest)
+    metrics.add_time("fetch", time.perf_counter() - start)
     typer.echo("Finished downloading docs")
+    return manifest
+
+
+_SPACE_RUNS = re.compile(" {2,}")
+_TITLE_PREFIX = re.compile(".*Actions, resources, and condition keys for *")
 
 
 def chomp(string: str) -> str:
     """This chomp cleans up all white-space, not just at the ends"""
-    string = str(string)
-    response = string.replace("\n", " ")  # Convert line ends to spaces
-    response = re.sub(
-        " [ ]*", " ", response
-    )  # Truncate multiple spaces to single space
-    response = re.sub("^[ ]*", "", response)  # Clean start
-    return re.sub("[ ]*$", "", response)  # Clean end
+    response = str(string).replace("\n", " ")  # Convert line ends to spaces
+    if "  " in response:
+        response = _SPACE_RUNS.sub(" ", response)  # Truncate multiple spaces
+    return response.strip(" ")  # Clean start and end
 
 
 def no_white_space(string: str) -> str:
-    string = str(string)
-    response = string.replace("\n", "")  # Convert line ends to spaces
-    response = re.sub("[ ]*", "", response)
-    return response
-
-
-def header_matches(string: str, table: PageElement) -> bool:
-    headers = [chomp(str(x)).lower() for x in table.find_all("th")]
-    match_found = False
-    for header in headers:
-        if string in header:
-            match_found = True
-    if not match_found:
-        return False
-    return True
+    return str(string).replace("\n", "").replace(" ", "")
 
 
-def get_docs(json_path: str):
-    # Create the docs directory
-    Path("/tmp/docs").mkdir(parents=True, exist_ok=True)
+# Kinds of tables on a service page, in the order their rows are collected
+ACTIONS_TABLE = "actions"
+RESOURCES_TABLE = "resources"
+CONDITIONS_TABLE = "conditions"
 
-    update_html_docs_directory("/tmp/docs/")
 
-    mypath = "/tmp/docs/"
-    schema = []
+def classify_table(table: Tag) -> Set[str]:
+    """Returns the kinds of table `table` is, judging from its header cells.
 
-    # for filename in ['list_amazons3.html']:
-    files = [f for f in listdir(mypath) if isfile(join(mypath, f))]
-    with typer.progressbar(files, label="Converting docs to json") as progress:
-        for filename in progress:
-            if not filename.startswith("list_"):
+    There can be 3 tables, the actions table, an ARN table, and a condition key table
+    Example: https://docs.aws.amazon.com/IAM/latest/UserGuide/list_awssecuritytokenservice.html
+    """
+    headers = [chomp(header.text).lower() for header in table.find_all("th")]
+
+    def any_header(text: str) -> bool:
+        return any(text in header for header in headers)
+
+    kinds = set()
+    if any_header("actions") and any_header("description"):
+        kinds.add(ACTIONS_TABLE)
+    if any_header("resource types") and any_header("arn"):
+        kinds.add(RESOURCES_TABLE)
+    if "condition keys" in headers and "type" in headers:
+        kinds.add(CONDITIONS_TABLE)
+    return kinds
+
+
+def resolve_parser(parser: str = "auto") -> str:
+    """Returns the parser backend to use for `parser`, falling back to the
+    pure-Python html.parser when the requested one is not installed."""
+    candidates = FAST_PARSERS if parser == "auto" else (parser,)
+    for candidate in candidates:
+        if candidate == "html.parser" or find_spec(candidate) is not None:
+            return candidate
+    typer.echo(f"{parser} is not installed, parsing docs with html.parser")
+    return "html.parser"
+
+
+def make_soup(markup: str, parser: str = "html.parser"):
+    """Parses `markup` with the given backend. lxml builds its tree in C and is
+    wrapped to provide the same Tag API as the BeautifulSoup tree."""
+    if parser == "lxml":
+        from aws_iam_db.lxml_soup import lxml_soup
+
+        return lxml_soup(markup)
+    return BeautifulSoup(markup, parser)
+
+
+def parse_service_page(
+    path: str, parser: str = "html.parser", page: Optional[str] = None
+) -> Optional[dict]:
+    """Parses a single docs page into its service schema, or None for non-service
+    pages. `page` names the page in warnings, and defaults to the file name."""
+    filename = page or basename(path)
+    soup = make_soup(read_page(path), parser)
+    # Everything below only looks inside the main-content subtree
+    main_content = soup.find(id="main-content")
+    if main_content is None:
+        return None
+
+    # Get service name
+    title = main_content.find("h1", class_="topictitle").text
+    title = _TITLE_PREFIX.sub("", str(title))
+    title = title.replace("</h1>", "")
+    service_name = chomp(title)
+
+    prefix = ""
+    for c in main_content.find("h1", class_="topictitle").parent.children:
+        if "prefix" in str(c):
+            prefix = str(c)
+            prefix = prefix.split('<code class="code">')[1]
+            prefix = chomp(prefix.split("</code>")[0])
+            break
+
+    service_schema = {
+        "service_name": service_name,
+        "prefix": prefix,
+        "privileges": [],
+        "resources": [],
+        "conditions": [],
+    }
+
+    # Headers are read once per table, then each kind of table is handled in turn
+    tables = {ACTIONS_TABLE: [], RESOURCES_TABLE: [], CONDITIONS_TABLE: []}
+    for table in main_content.find_all("div", class_="table-contents"):
+        for kind in classify_table(table):
+            tables[kind].append(table)
+
+    for table in tables[ACTIONS_TABLE]:
+        rows = table.find_all("tr")
+        row_number = 0
+        while row_number < len(rows):
+            row = rows[row_number]
+
+            cells = row.find_all("td")
+            if len(cells) == 0:
+                # Skip the header row, which has th, not td cells
+                row_number += 1
                 continue
 
-            with open(mypath + filename, "r") as f:
-                soup = BeautifulSoup(f.read(), "html.parser")
-                main_content = soup.find(id="main-content")
-                if main_content is None:
+            if len(cells) != 6:
+                # Sometimes the privilege contains Scenarios, and I don't know how to handle this
+                break
+                # raise Exception("Unexpected format in {}: {}".format(prefix, row))
+
+            # See if this cell spans multiple rows
+            rowspan = 1
+            if "rowspan" in cells[0].attrs:
+                rowspan = int(cells[0].attrs["rowspan"])
+
+            priv = ""
+            # Get the privilege
+            for link in cells[0].find_all("a"):
+                if "href" not in link.attrs:
+                    # Skip the <a id='...'> tags
                     continue
+                priv = chomp(link.text)
+            if priv == "":
+                priv = chomp(cells[0].text)
+
+            description = chomp(cells[1].text)
+            access_level = chomp(cells[2].text)
+
+            resource_types = []
+            resource_cell = 3
+
+            while rowspan > 0:
+                if len(cells) == 3 or len(cells) == 6:
+                    # ec2:RunInstances contains a few "scenarios" which start in the
+                    # description field, len(cells) is 5.
+                    # I'm ignoring these as I don't know how to handle them.
+                    # These include things like "EC2-Classic-InstanceStore" and
+                    # "EC2-VPC-InstanceStore-Subnet"
+
+                    resource_type = chomp(cells[resource_cell].text)
+                    condition_keys_element = cells[resource_cell + 1]
+                    condition_keys = []
+                    if condition_keys_element.text != "":
+                        for key_element in condition_keys_element.find_all("p"):
+                            condition_keys.append(chomp(key_element.text))
+
+                    dependent_actions_element = cells[resource_cell + 2]
+                    dependent_actions = []
+                    if dependent_actions_element.text != "":
+                        for action_element in dependent_actions_element.find_all("p"):
+                            dependent_actions.append(chomp(action_element.text))
+                    resource_types.append(
+                        {
+                            "resource_type": resource_type,
+                            "condition_keys": condition_keys,
+                            "dependent_actions": dependent_actions,
+                        }
+                    )
+                rowspan -= 1
+                if rowspan > 0:
+                    row_number += 1
+                    resource_cell = 0
+                    row = rows[row_number]
+                    cells = row.find_all("td")
+
+            if "[permission only]" in priv:
+                priv = priv.split(" ")[0]
+
+            privilege_schema = {
+                "privilege": priv,
+                "description": description,
+                "access_level": access_level,
+                "resource_types": resource_types,
+            }
+
+            service_schema["privileges"].append(privilege_schema)
+            row_number += 1
+
+    # Get resource table
+    for table in tables[RESOURCES_TABLE]:
+        rows = table.find_all("tr")
+        for row in rows:
+            cells = row.find_all("td")
+            if len(cells) == 0:
+                # Skip the header row, which has th, not td cells
+                continue
 
-                # Get service name
-                title = main_content.find("h1", class_="topictitle").text
-                title = re.sub(
-                    ".*Actions, resources, and condition keys for *", "", str(title)
+            if len(cells) != 3:
+                raise Exception(
+                    "Unexpected number of resource cells {} in {}".format(
+                        len(cells), filename
+                    )
                 )
-                title = title.replace("</h1>", "")
-                service_name = chomp(title)
-
-                prefix = ""
-                for c in main_content.find("h1", class_="topictitle").parent.children:
-                    if "prefix" in str(c):
-                        prefix = str(c)
-                        prefix = prefix.split('<code class="code">')[1]
-                        prefix = chomp(prefix.split("</code>")[0])
-                        break
-
-                service_schema = {
-                    "service_name": service_name,
-                    "prefix": prefix,
-                    "privileges": [],
-                    "resources": [],
-                    "conditions": [],
+
+            resource = chomp(cells[0].text)
+
+            arn = no_white_space(cells[1].text)
+            conditions = []
+            for condition in cells[2].find_all("p"):
+                conditions.append(chomp(condition.text))
+
+            service_schema["resources"].append(
+                {
+                    "resource": resource,
+                    "arn": arn,
+                    "condition_keys": conditions,
                 }
+            )
 
-                tables = main_content.find_all("div", class_="table-contents")
-
-                for table in tables:
-                    # There can be 3 tables, the actions table, an ARN table, and a condition key table
-                    # Example: https://docs.aws.amazon.com/IAM/latest/UserGuide/list_awssecuritytokenservice.html
-                    if not header_matches("actions", table) or not header_matches(
-                        "description", table
-                    ):
-                        continue
-
-                    rows = table.find_all("tr")
-                    row_number = 0
-                    while row_number < len(rows):
-                        row = rows[row_number]
-
-                        cells = row.find_all("td")
-                        if len(cells) == 0:
-                            # Skip the header row, which has th, not td cells
-                            row_number += 1
-                            continue
-
-                        if len(cells) != 6:
-                            # Sometimes the privilege contains Scenarios, and I don't know how to handle this
-                            break
-                            # raise Exception("Unexpected format in {}: {}".format(prefix, row))
-
-                        # See if this cell spans multiple rows
-                        rowspan = 1
-                        if "rowspan" in cells[0].attrs:
-                            rowspan = int(cells[0].attrs["rowspan"])
-
-                        priv = ""
-                        # Get the privilege
-                        for link in cells[0].find_all("a"):
-                            if "href" not in link.attrs:
-                                # Skip the <a id='...'> tags
-                                continue
-                            priv = chomp(link.text)
-                        if priv == "":
-                            priv = chomp(cells[0].text)
-
-                        description = chomp(cells[1].text)
-                        access_level = chomp(cells[2].text)
-
-                        resource_types = []
-                        resource_cell = 3
-
-                        while rowspan > 0:
-                            if len(cells) == 3 or len(cells) == 6:
-                                # ec2:RunInstances contains a few "scenarios" which start in the
-                                # description field, len(cells) is 5.
-                                # I'm ignoring these as I don't know how to handle them.
-                                # These include things like "EC2-Classic-InstanceStore" and
-                                # "EC2-VPC-InstanceStore-Subnet"
-
-                                resource_type = chomp(cells[resource_cell].text)
-                                condition_keys_element = cells[resource_cell + 1]
-                                condition_keys = []
-                                if condition_keys_element.text != "":
-                                    for key_element in condition_keys_element.find_all(
-                                        "p"
-                                    ):
-                                        condition_keys.append(chomp(key_element.text))
-
-                                dependent_actions_element = cells[resource_cell + 2]
-                                dependent_actions = []
-                                if dependent_actions_element.text != "":
-                                    for (
-                                        action_element
-                                    ) in dependent_actions_element.find_all("p"):
-                                        dependent_actions.append(
-                                            chomp(action_element.text)
-                                        )
-                                resource_types.append(
-                                    {
-                                        "resource_type": resource_type,
-                                        "condition_keys": condition_keys,
-                                        "dependent_actions": dependent_actions,
-                                    }
-                                )
-                            rowspan -= 1
-                            if rowspan > 0:
-                                row_number += 1
-                                resource_cell = 0
-                                row = rows[row_number]
-                                cells = row.find_all("td")
-
-                        if "[permission only]" in priv:
-                            priv = priv.split(" ")[0]
-
-                        privilege_schema = {
-                            "privilege": priv,
-                            "description": description,
-                            "access_level": access_level,
-                            "resource_types": resource_types,
-                        }
+    # Get condition keys table
+    for table in tables[CONDITIONS_TABLE]:
+        rows = table.find_all("tr")
+        for row in rows:
+            cells = row.find_all("td")
 
-                        service_schema["privileges"].append(privilege_schema)
-                        row_number += 1
-
-                # Get resource table
-                for table in tables:
-                    if not header_matches(
-                        "resource types", table
-                    ) or not header_matches("arn", table):
-                        continue
-
-                    rows = table.find_all("tr")
-                    for row in rows:
-                        cells = row.find_all("td")
-                        if len(cells) == 0:
-                            # Skip the header row, which has th, not td cells
-                            continue
-
-                        if len(cells) != 3:
-                            raise Exception(
-                                "Unexpected number of resource cells {} in {}".format(
-                                    len(cells), filename
-                                )
-                            )
-
-                        resource = chomp(cells[0].text)
-
-                        arn = no_white_space(cells[1].text)
-                        conditions = []
-                        for condition in cells[2].find_all("p"):
-                            conditions.append(chomp(condition.text))
-
-                        service_schema["resources"].append(
-                            {
-                                "resource": resource,
-                                "arn": arn,
-                                "condition_keys": conditions,
-                            }
-                        )
-
-                # Get condition keys table
-                for table in tables:
-                    if not (
-                        header_matches("<th> condition keys </th>", table)
-                        and header_matches("<th> type </th>", table)
-                    ):
-                        continue
-
-                    rows = table.find_all("tr")
-                    for row in rows:
-                        cells = row.find_all("td")
-
-                        if len(cells) == 0:
-                            # Skip the header row, which has th, not td cells
-                            continue
-
-                        if len(cells) != 3:
-                            raise Exception(
-                                "Unexpected number of condition cells {} in {}".format(
-                                    len(cells), filename
-                                )
-                            )
-
-                        condition = no_white_space(cells[0].text)
-                        description = chomp(cells[1].text)
-                        value_type = chomp(cells[2].text)
-
-                        service_schema["conditions"].append(
-                            {
-                                "condition": condition,
-                                "description": description,
-                                "type": value_type,
-                            }
-                        )
-                schema.append(service_schema)
+            if len(cells) == 0:
+                # Skip the header row, which has th, not td cells
+                continue
+
+            if len(cells) != 3:
+                raise Exception(
+                    "Unexpected number of condition cells {} in {}".format(
+                        len(cells), filename
+                    )
+                )
+
+            condition = no_white_space(cells[0].text)
+            description = chomp(cells[1].text)
+            value_type = chomp(cells[2].text)
+
+            service_schema["conditions"].append(
+                {
+                    "condition": condition,
+                    "description": description,
+                    "type": value_type,
+                }
+            )
+    return service_schema
+
+
+def _schema_cache_path(html_docs_directory: str, page: str) -> str:
+    return join(html_docs_directory, SCHEMA_CACHE_DIRNAME, page + ".json")
+
+
+def _parse_pages(pages: Iterable[tuple], parser: str, jobs: int) -> Iterator[tuple]:
+    """Parses (path, filename) pages in order, yielding (seconds, schema) for each.
+
+    With `jobs` > 1 they are parsed in that many processes, with at most twice as
+    many pages in flight, so parsed schemas do not pile up in this process when
+    they are consumed more slowly than they are parsed."""
+    parse = partial(timed, parse_service_page)
+    if jobs <= 1:
+        for path, filename in pages:
+            yield parse(path, parser, filename)
+        return
+    pages = iter(pages)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        window = deque(
+            executor.submit(parse, path, parser, filename)
+            for path, filename in islice(pages, 2 * jobs)
+        )
+        while window:
+            future = window.popleft()
+            for path, filename in islice(pages, 1):
+                window.append(executor.submit(parse, path, parser, filename))
+            yield future.result()
+
+
+def parse_docs(
+    html_docs_directory: str,
+    manifest: dict,
+    jobs: int = 1,
+    parser: str = "auto",
+    metrics: Optional[Metrics] = None,
+) -> Iterator[dict]:
+    """Yields the service schema of every page in the manifest, in page name order.
+
+    Pages that were not modified since the last run are read back from the schema
+    cache, the others are parsed from the page cache, using `jobs` processes, and
+    cached. The wall time spent is added to the "parse" stage of `metrics`, and
+    the time each stale page took to parse to its pages."""
+    metrics = metrics or Metrics()
+    Path(html_docs_directory, SCHEMA_CACHE_DIRNAME).mkdir(parents=True, exist_ok=True)
+    mypath = html_docs_directory
+
+    # for filename in ['list_amazons3.html']:
+    files = sorted(f for f in manifest["pages"] if f.startswith("list_"))
+    stale = [
+        filename
+        for filename in files
+        if not manifest["pages"][filename].get("parsed")
+        or not isfile(_schema_cache_path(mypath, filename))
+    ]
+
+    # Parsing is CPU bound and independent per page, so spread it over processes
+    results = _parse_pages(
+        (
+            (page_cache_path(mypath, manifest["pages"][filename]["sha256"]), filename)
+            for filename in stale
+        ),
+        resolve_parser(parser),
+        jobs,
+    )
+    stale = set(stale)
+    try:
+        with typer.progressbar(files, label="Converting docs to json") as progress:
+            for filename in progress:
+                # Timed here rather than summed from the pages, which are parsed
+                # concurrently, so that the stage is wall time
+                with metrics.timer("parse"):
+                    cache_path = _schema_cache_path(mypath, filename)
+                    if filename in stale:
+                        seconds, service_schema = next(results)
+                        metrics.add_page("parse", filename, seconds)
+                        with open(cache_path, "w") as cache_file:
+                            cache_file.write(json.dumps(service_schema))
+                        manifest["pages"][filename]["parsed"] = True
+                    else:
+                        with open(cache_path, "r") as cache_file:
+                            service_schema = json.load(cache_file)
+                if service_schema is not None:
+                    yield service_schema
+    finally:
+        results.close()
+    save_manifest(mypath, manifest)
     typer.echo("Finished processing docs to JSON")
+
+
+def fetch_docs(
+    workers: int = 1,
+    rate_limit: float = 0.0,
+    url_prefix: str = DOCS_URL_PREFIX,
+    full_refresh: bool = False,
+    metrics: Optional[Metrics] = None,
+    docs_directory: str = DOCS_DIRECTORY,
+) -> dict:
+    """Refreshes the docs pages cached in docs_directory, returning the updated
+    manifest"""
+    return update_html_docs_directory(
+        docs_directory, workers, rate_limit, url_prefix, full_refresh, metrics
+    )
+
+
+def stream_docs(
+    workers: int = 1,
+    rate_limit: float = 0.0,
+    url_prefix: str = DOCS_URL_PREFIX,
+    full_refresh: bool = False,
+    jobs: int = 1,
+    parser: str = "auto",
+    metrics: Optional[Metrics] = None,
+    docs_directory: str = DOCS_DIRECTORY,
+) -> Iterator[dict]:
+    """Refreshes the docs and yields one service schema at a time as it is parsed"""
+    manifest = fetch_docs(
+        workers, rate_limit, url_prefix, full_refresh, metrics, docs_directory
+    )
+    yield from parse_docs(docs_directory, manifest, jobs, parser, metrics)
+
+
+def write_ndjson(services: Iterable[dict], json_path: str) -> Iterator[dict]:
+    """Passes services through, writing each one to `json_path` as a line of JSON"""
+    with open(json_path, "w") as out_file:
+        for service_schema in services:
+            out_file.write(json.dumps(service_schema, sort_keys=True) + "\n")
+            yield service_schema
+
+
+def get_docs(
+    json_path: str,
+    workers: int = 1,
+    rate_limit: float = 0.0,
+    url_prefix: str = DOCS_URL_PREFIX,
+    full_refresh: bool = False,
+    jobs: int = 1,
+    parser: str = "auto",
+    docs_directory: str = DOCS_DIRECTORY,
+):
+    schema = list(
+        stream_docs(
+            workers,
+            rate_limit,
+            url_prefix,
+            full_refresh,
+            jobs,
+            parser,
+            docs_directory=docs_directory,
+        )
+    )
     schema.sort(key=lambda x: x["prefix"])
     with open(json_path, "w") as out_file:
         json.dump(schema, out_file, indent=2, sort_keys=True)
@@ -0,0 +1,110 @@
+"""Expansion of IAM action wildcards such as s3:Get*, ec2:*Instance* or *:List*.
+
+ActionIndex keeps the action names of every service in a sorted list, so the
+literal part of a pattern before its first wildcard is resolved with a binary
+search. Only the names in that range are matched against the rest of the
+pattern. Expansions are cached in a bounded LRU cache, since policy corpora
+repeat the same patterns over and over.
+"""
+
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+import re
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from aws_iam_db import query
+
+WILDCARDS = ("*", "?")
+
+
+def _literal_prefix(pattern: str) -> str:
+    """The part of a pattern before its first wildcard"""
+    positions = [pattern.find(w) for w in WILDCARDS if w in pattern]
+    return pattern[: min(positions)] if positions else pattern
+
+
+@lru_cache(maxsize=4096)
+def _compile(pattern: str) -> "re.Pattern":
+    """IAM wildcards: * matches any run of characters and ? any single one.
+    Unlike fnmatch, brackets have no special meaning."""
+    parts = (
+        ".*" if char == "*" else "." if char == "?" else re.escape(char)
+        for char in pattern
+    )
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def _select(names: Sequence[str], pattern: str) -> Iterable[int]:
+    """Returns the indexes of the sorted `names` that match `pattern`"""
+    literal = _literal_prefix(pattern)
+    start = bisect_left(names, literal)
+    if literal == pattern:
+        return range(start, start + (names[start : start + 1] == [literal]))
+    # Every name starting with the literal prefix sorts between these two
+    candidates = range(start, bisect_right(names, literal + "\U0010ffff", lo=start))
+    if pattern == literal + "*":
+        return candidates
+    regex = _compile(pattern)
+    return (i for i in candidates if regex.fullmatch(names[i]))
+
+
+class ActionIndex:
+    """In-memory index of IAM action names answering wildcard expansions"""
+
+    def __init__(self, actions: Iterable[str], cache_size: int = 65536):
+        services: Dict[str, List[Tuple[str, str]]] = {}
+        for action in actions:
+            prefix, _, name = action.partition(":")
+            services.setdefault(prefix.lower(), []).append((name.lower(), action))
+        self._prefixes = sorted(services)
+        # Per service prefix: the lowercased action names, sorted, and the names as
+        # documented in the same order
+        self._services: Dict[str, Tuple[List[str], List[str]]] = {}
+        for prefix, names in services.items():
+            names.sort()
+            self._services[prefix] = (
+                [lower for lower, _ in names],
+                [action for _, action in names],
+            )
+        self._cached_expand = lru_cache(maxsize=cache_size)(self._expand)
+
+    @classmethod
+    def from_database(cls, db_path: str, cache_size: int = 65536) -> "ActionIndex":
+        connection = query.connect(db_path)
+        try:
+            names = [row[0] for row in connection.execute("SELECT name FROM action")]
+        finally:
+            connection.close()
+        return cls(names, cache_size)
+
+    def __len__(self) -> int:
+        return sum(len(names) for names, _ in self._services.values())
+
+    def _expand(self, pattern: str) -> Tuple[str, ...]:
+        pattern = pattern.lower()
+        if pattern == "*":
+            return tuple(
+                action
+                for prefix in self._prefixes
+                for action in self._services[prefix][1]
+            )
+        service_pattern, separator, action_pattern = pattern.partition(":")
+        if not separator:
+            return ()
+        expanded = []
+        for i in _select(self._prefixes, service_pattern):
+            names, actions = self._services[self._prefixes[i]]
+            expanded.extend(actions[j] for j in _select(names, action_pattern))
+        return tuple(expanded)
+
+    def expand(self, pattern: str) -> Tuple[str, ...]:
+        """Returns the actions matching an IAM action pattern, case-insensitively"""
+        return self._cached_expand(pattern)
+
+    def expand_many(self, patterns: Iterable[str]) -> Dict[str, Tuple[str, ...]]:
+        """Expands a batch of patterns, returning the actions matched by each"""
+        expand = self._cached_expand
+        return {pattern: expand(pattern) for pattern in patterns}
+
+    def cache_info(self):
+        return self._cached_expand.cache_info()
@@ -0,0 +1,161 @@
+"""Columnar export of a database built by aws-iam-db, for pandas, DuckDB and the like.
+
+Every table is written to its own Parquet or Arrow IPC file. Actions, resource
+types and condition keys carry their service prefix so they can be filtered
+without a join, and the low-cardinality prefix, access_level and type columns
+are dictionary-encoded. Tables are read with the sqlite3 module, without going
+through the SQLAlchemy models, and written a batch of rows at a time, so memory
+stays bounded by the batch size rather than the size of the table.
+
+Needs pyarrow, installed with the `export` extra.
+"""
+
+import os
+from typing import Dict, Iterator, Tuple
+
+from aws_iam_db import query
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+# Columns with few distinct values, stored once per file and referenced by index
+DICTIONARY_COLUMNS = ("prefix", "access_level", "type")
+# Rows fetched from SQLite and written out at a time
+BATCH_ROWS = 50000
+
+# Query exporting each table. Column types follow from the column names, see
+# _arrow_type.
+TABLES = {
+    "service": "SELECT id, name, prefix, content_hash FROM service ORDER BY id",
+    "action": "SELECT a.id, a.service_id, s.prefix, a.name, a.description,"
+    " a.access_level FROM action a JOIN service s ON s.id = a.service_id"
+    " ORDER BY a.id",
+    "resource": "SELECT r.id, r.service_id, s.prefix, r.name, r.arn, r.required"
+    " FROM resource r JOIN service s ON s.id = r.service_id ORDER BY r.id",
+    "condition": "SELECT c.id, c.service_id, s.prefix, c.name, c.description, c.type"
+    " FROM condition c JOIN service s ON s.id = c.service_id ORDER BY c.id",
+    "action_resource": "SELECT action_id, resource_id FROM action_resource"
+    " ORDER BY action_id, resource_id",
+    "resource_condition": "SELECT resource_id, condition_id FROM resource_condition"
+    " ORDER BY resource_id, condition_id",
+    "dependent_action": "SELECT id, action_id, name, resource, dependent_id"
+    " FROM dependent_action ORDER BY id",
+    "action_closure": "SELECT action_id, dependent_id, depth FROM action_closure"
+    " ORDER BY action_id, dependent_id",
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception(
+            "Exporting needs pyarrow, install it with"
+            " `python -m pip install aws-iam-db[export]`"
+        )
+    return pyarrow
+
+
+def _arrow_type(pa, column: str):
+    if column in ("id", "depth") or column.endswith("_id"):
+        return pa.int64()
+    if column == "required":
+        return pa.bool_()
+    return pa.string()
+
+
+def read_batches(connection, sql: str, batch_rows: int = BATCH_ROWS) -> Tuple:
+    """Runs a query, returning the schema of its result and an iterator over it as
+    pyarrow RecordBatches of up to `batch_rows` rows"""
+    pa = _pyarrow()
+    cursor = connection.execute(sql)
+    names = [column[0] for column in cursor.description]
+    # One dictionary per column for the whole table, as the batches of an Arrow
+    # IPC file cannot each have their own
+    dictionaries = {
+        name: pa.array(
+            sorted(
+                value
+                for (value,) in connection.execute(
+                    f"SELECT DISTINCT {name} FROM ({sql})"
+                )
+                if value is not None
+            ),
+            type=pa.string(),
+        )
+        for name in names
+        if name in DICTIONARY_COLUMNS
+    }
+    schema = pa.schema(
+        (
+            pa.field(name, pa.dictionary(pa.int32(), pa.string()))
+            if name in dictionaries
+            else pa.field(name, _arrow_type(pa, name))
+        )
+        for name in names
+    )
+
+    def batches() -> Iterator:
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                return
+            arrays = []
+            for field, values in zip(schema, zip(*rows)):
+                if field.name in dictionaries:
+                    dictionary = dictionaries[field.name]
+                    indices = pa.compute.index_in(values, value_set=dictionary)
+                    array = pa.DictionaryArray.from_arrays(indices, dictionary)
+                elif field.type == pa.bool_():
+                    # SQLite stores booleans as integers
+                    array = pa.array(values, type=pa.int8()).cast(field.type)
+                else:
+                    array = pa.array(values, type=field.type)
+                arrays.append(array)
+            yield pa.record_batch(arrays, schema=schema)
+
+    return schema, batches()
+
+
+def export_database(
+    db_path: str, directory: str, format: str = "parquet"
+) -> Dict[str, str]:
+    """Writes every table of the database to `directory` in `format`, parquet or
+    arrow, returning the path written for each table"""
+    if format not in FORMATS:
+        raise Exception(f"Unknown export format {format}, use {' or '.join(FORMATS)}")
+    pa = _pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    connection = query.connect(db_path)
+    existing = {
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )
+    }
+    paths = {}
+    try:
+        for table_name, sql in TABLES.items():
+            # Databases built by older versions lack the newer tables, and the
+            # dependent_id column until they are updated
+            if table_name not in existing:
+                continue
+            if table_name == "dependent_action" and not any(
+                column[1] == "dependent_id"
+                for column in connection.execute("PRAGMA table_info(dependent_action)")
+            ):
+                sql = sql.replace(", dependent_id", "")
+            schema, batches = read_batches(connection, sql)
+            path = os.path.join(directory, table_name + FORMATS[format])
+            if format == "parquet":
+                writer = pa.parquet.ParquetWriter(path, schema, compression="zstd")
+            else:
+                writer = pa.ipc.new_file(path, schema)
+            with writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+            paths[table_name] = path
+    finally:
+        connection.close()
+    return paths
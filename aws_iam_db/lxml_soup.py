@@ -0,0 +1,79 @@
+"""A small BeautifulSoup look-alike backed by an lxml tree.
+
+parse_service_page only uses a handful of Tag features: find, find_all, text,
+attrs, parent, children and str(). Providing those over lxml elements lets the
+same parsing code run on lxml's C tree instead of a BeautifulSoup tree built in
+Python, which is where most of the parse time goes.
+"""
+
+from functools import lru_cache
+from typing import Iterator, List, Optional
+
+from lxml import etree, html
+
+
+@lru_cache(maxsize=None)
+def _descendants(name: Optional[str], class_: Optional[str], id: Optional[str]):
+    path = "descendant::" + (name or "*")
+    if class_ is not None:
+        path += f"[contains(concat(' ', normalize-space(@class), ' '), ' {class_} ')]"
+    if id is not None:
+        path += f"[@id='{id}']"
+    return etree.XPath(path), etree.XPath(f"({path})[1]")
+
+
+class LxmlTag:
+    """Wraps an lxml element with the subset of the bs4 Tag API used by the parser"""
+
+    __slots__ = ("element",)
+
+    def __init__(self, element: etree._Element):
+        self.element = element
+
+    @property
+    def name(self) -> str:
+        return self.element.tag
+
+    @property
+    def attrs(self) -> dict:
+        return dict(self.element.attrib)
+
+    @property
+    def text(self) -> str:
+        return str(self.element.text_content())
+
+    @property
+    def parent(self) -> Optional["LxmlTag"]:
+        parent = self.element.getparent()
+        return None if parent is None else LxmlTag(parent)
+
+    @property
+    def children(self) -> Iterator["LxmlTag"]:
+        # Comments and processing instructions have a non-string tag
+        return (LxmlTag(child) for child in self.element if isinstance(child.tag, str))
+
+    def find_all(
+        self, name: Optional[str] = None, class_: Optional[str] = None, id=None
+    ) -> List["LxmlTag"]:
+        find_all, _ = _descendants(name, class_, id)
+        return [LxmlTag(element) for element in find_all(self.element)]
+
+    findAll = find_all
+
+    def find(
+        self, name: Optional[str] = None, class_: Optional[str] = None, id=None
+    ) -> Optional["LxmlTag"]:
+        _, find = _descendants(name, class_, id)
+        found = find(self.element)
+        return LxmlTag(found[0]) if found else None
+
+    def __str__(self) -> str:
+        return etree.tostring(
+            self.element, encoding="unicode", method="html", with_tail=False
+        )
+
+
+def lxml_soup(markup: str) -> LxmlTag:
+    """Parses an HTML document with lxml, returning its root as an LxmlTag"""
+    parser = html.HTMLParser(encoding="utf-8")
+    return LxmlTag(html.document_fromstring(markup.encode("utf-8"), parser=parser))
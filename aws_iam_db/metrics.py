@@ -0,0 +1,117 @@
+"""Timings of the pipeline stages, written out as a JSON report.
+
+Download, parse and build take an optional Metrics and record into it the time
+taken by each page fetched and parsed, and the rows inserted into each table
+with the time the inserts took. Parsing runs in worker processes, so page
+timings are measured where the work happens and returned with the result.
+"""
+
+from contextlib import contextmanager
+import cProfile
+import json
+import pstats
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+def timed(function, *args, **kwargs) -> tuple:
+    """Calls function, returning (seconds taken, result). Picklable, so it can
+    wrap work sent to a process pool."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def peak_rss_mb() -> Dict[str, Optional[float]]:
+    """Peak resident memory of this process and of its largest child process"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return {"process": None, "children": None}
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return {
+        who: round(resource.getrusage(usage).ru_maxrss / scale, 1)
+        for who, usage in (
+            ("process", resource.RUSAGE_SELF),
+            ("children", resource.RUSAGE_CHILDREN),
+        )
+    }
+
+
+class Metrics:
+    """Collects stage, page and table timings of one pipeline run"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.pages: Dict[str, Dict[str, float]] = {}
+        self.tables: Dict[str, List[float]] = {}
+
+    def add_time(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Adds the time spent in the block to the stage. Stages interleave when
+        services are streamed, so a stage can be timed in several blocks."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_page(self, stage: str, page: str, seconds: float):
+        self.pages.setdefault(stage, {})[page] = seconds
+
+    def add_rows(self, table: str, rows: int, seconds: float):
+        totals = self.tables.setdefault(table, [0, 0.0])
+        totals[0] += rows
+        totals[1] += seconds
+
+    def report(self, slowest: int = 10) -> dict:
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "stages": {stage: round(s, 3) for stage, s in self.stages.items()},
+            "slowest_pages": {
+                stage: [
+                    {"page": page, "seconds": round(seconds, 4)}
+                    for page, seconds in sorted(
+                        pages.items(), key=lambda item: item[1], reverse=True
+                    )[:slowest]
+                ]
+                for stage, pages in self.pages.items()
+            },
+            "tables": {
+                table: {
+                    "rows": rows,
+                    "seconds": round(seconds, 4),
+                    "rows_per_second": round(rows / seconds) if seconds else None,
+                }
+                for table, (rows, seconds) in self.tables.items()
+            },
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def write(self, path: str, slowest: int = 10):
+        with open(path, "w") as report_file:
+            json.dump(self.report(slowest), report_file, indent=2)
+
+
+@contextmanager
+def profiled(path: Optional[str], top: int = 30):
+    """Runs the block under cProfile when path is set, saving the stats to path
+    and printing the functions with the highest cumulative time to stderr"""
+    if path is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+        stats = pstats.Stats(profile, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(top)
@@ -0,0 +1,216 @@
+"""Read-only lookups against a database built by aws-iam-db.
+
+Lookups go through the sqlite3 module rather than the SQLAlchemy models. Each one
+is a single indexed query, and skipping the ORM keeps them well under a
+millisecond.
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Tables covered by the full-text search index. The rowid of a search entry is
+# id * len(SEARCH_TABLES) + the position of its table in this tuple.
+SEARCH_TABLES = ("action", "resource", "condition")
+
+
+def connect(db_path: str, immutable: bool = False) -> sqlite3.Connection:
+    """Opens the database read-only. With `immutable` SQLite also skips locking
+    and change detection, so the file must not be modified while it is open."""
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def _where(clauses: Dict[str, Optional[str]]) -> tuple:
+    """Builds a WHERE clause from the clauses whose parameter is not None"""
+    used = [(clause, value) for clause, value in clauses.items() if value is not None]
+    if not used:
+        return "", ()
+    return " WHERE " + " AND ".join(clause for clause, _ in used), tuple(
+        value for _, value in used
+    )
+
+
+def _limit(limit: Optional[int]) -> str:
+    return "" if limit is None else f" LIMIT {int(limit)}"
+
+
+def get_action(connection: sqlite3.Connection, name: str) -> Optional[dict]:
+    """Returns an action with its resource types, their condition keys and the
+    action's dependent actions, or None if there is no such action. Names are
+    matched case-insensitively, like IAM does."""
+    row = connection.execute(
+        "SELECT a.id, a.name, a.description, a.access_level, s.prefix"
+        " FROM action a JOIN service s ON s.id = a.service_id WHERE a.name = ?",
+        (name,),
+    ).fetchone()
+    if row is None:
+        return None
+    action = dict(row)
+    action_id = action.pop("id")
+
+    resources = {}
+    for resource in connection.execute(
+        "SELECT r.id, r.name, r.arn, r.required FROM action_resource ar"
+        " JOIN resource r ON r.id = ar.resource_id WHERE ar.action_id = ?"
+        " ORDER BY r.id",
+        (action_id,),
+    ):
+        resources[resource["id"]] = {
+            "name": resource["name"],
+            "arn": resource["arn"],
+            "required": bool(resource["required"]),
+            "condition_keys": [],
+        }
+    for condition in connection.execute(
+        "SELECT rc.resource_id, c.name FROM action_resource ar"
+        " JOIN resource_condition rc ON rc.resource_id = ar.resource_id"
+        " JOIN condition c ON c.id = rc.condition_id WHERE ar.action_id = ?"
+        " ORDER BY c.id",
+        (action_id,),
+    ):
+        resources[condition["resource_id"]]["condition_keys"].append(condition["name"])
+    action["resources"] = list(resources.values())
+
+    action["dependent_actions"] = [
+        dict(dependent)
+        for dependent in connection.execute(
+            "SELECT name, resource FROM dependent_action WHERE action_id = ?"
+            " ORDER BY id",
+            (action_id,),
+        )
+    ]
+    return action
+
+
+def get_action_closure(connection: sqlite3.Connection, name: str) -> Optional[list]:
+    """Returns every action needed to call an action: its dependent actions, theirs
+    and so on, each with the depth at which it is first needed, 1 for the direct
+    dependencies. Returns None if there is no such action."""
+    closure = [
+        dict(dependent)
+        for dependent in connection.execute(
+            "SELECT a.name, c.depth FROM action s"
+            " JOIN action_closure c ON c.action_id = s.id"
+            " JOIN action a ON a.id = c.dependent_id WHERE s.name = ?"
+            " ORDER BY c.depth, a.name",
+            (name,),
+        )
+    ]
+    if (
+        not closure
+        and not connection.execute(
+            "SELECT 1 FROM action WHERE name = ?", (name,)
+        ).fetchone()
+    ):
+        return None
+    return closure
+
+
+def find_actions(
+    connection: sqlite3.Connection,
+    prefix: Optional[str] = None,
+    access_level: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """Lists actions, optionally only those of a service prefix and/or access level"""
+    where, params = _where(
+        {
+            "a.service_id IN (SELECT id FROM service WHERE prefix = ?)": prefix,
+            "a.access_level = ?": access_level,
+        }
+    )
+    return [
+        dict(row)
+        for row in connection.execute(
+            "SELECT a.name, a.description, a.access_level FROM action a"
+            + where
+            + " ORDER BY a.name"
+            + _limit(limit),
+            params,
+        )
+    ]
+
+
+def find_resources(
+    connection: sqlite3.Connection,
+    name: Optional[str] = None,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """Lists resource types by name and/or service prefix"""
+    where, params = _where({"r.name = ?": name, "s.prefix = ?": prefix})
+    return [
+        dict(row, required=bool(row["required"]))
+        for row in connection.execute(
+            "SELECT s.prefix, r.name, r.arn, r.required FROM resource r"
+            " JOIN service s ON s.id = r.service_id"
+            + where
+            + " ORDER BY s.prefix, r.name"
+            + _limit(limit),
+            params,
+        )
+    ]
+
+
+def find_conditions(
+    connection: sqlite3.Connection,
+    name: Optional[str] = None,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """Lists condition keys by name and/or service prefix"""
+    where, params = _where({"c.name = ?": name, "s.prefix = ?": prefix})
+    return [
+        dict(row)
+        for row in connection.execute(
+            "SELECT s.prefix, c.name, c.description, c.type FROM condition c"
+            " JOIN service s ON s.id = c.service_id"
+            + where
+            + " ORDER BY s.prefix, c.name"
+            + _limit(limit),
+            params,
+        )
+    ]
+
+
+def search(
+    connection: sqlite3.Connection,
+    text: str,
+    table: Optional[str] = None,
+    limit: Optional[int] = 20,
+    ranked: bool = False,
+) -> List[dict]:
+    """Full-text search over names and descriptions.
+
+    Every word of `text` has to match. `table` restricts the results to one of
+    SEARCH_TABLES. Results come in database order unless `ranked` is set, which
+    orders them best match first but has to score every match, so common words
+    take milliseconds rather than microseconds."""
+    # Quote every word so characters such as ':' are not read as FTS5 syntax
+    match = " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+    if not match:
+        return []
+    sql = "SELECT rowid, name, description FROM search WHERE search MATCH ?"
+    params = [match]
+    if table is not None:
+        sql += f" AND rowid % {len(SEARCH_TABLES)} = ?"
+        params.append(SEARCH_TABLES.index(table))
+    if ranked:
+        sql += " ORDER BY rank"
+    results = []
+    for row in connection.execute(sql + _limit(limit), params):
+        row_id, table_index = divmod(row["rowid"], len(SEARCH_TABLES))
+        results.append(
+            {
+                "table": SEARCH_TABLES[table_index],
+                "id": row_id,
+                "name": row["name"],
+                "description": row["description"],
+            }
+        )
+    return results
@@ -0,0 +1,289 @@
+"""Read-only HTTP/JSON lookup service over a database built by aws-iam-db.
+
+The event loop parses requests and answers them from a bounded LRU cache of
+encoded responses. Cache misses are looked up by a pool of worker threads, each
+borrowing one of a fixed set of immutable, read-only SQLite connections. Every
+response carries the database's build hash as its ETag, so clients can
+revalidate found resources with If-None-Match and get a 304 until the database
+is rebuilt.
+
+    GET /                                  build hash
+    GET /actions?prefix=&access_level=&limit=
+    GET /actions/{name}                    action with resources and dependents
+    GET /actions/{name}/dependent-actions
+    GET /actions/{name}/closure            every action needed, at any depth
+    GET /resources?name=&prefix=&limit=
+    GET /conditions?name=&prefix=&limit=
+    GET /search?q=&table=&limit=
+"""
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import json
+import queue
+import re
+import sqlite3
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from aws_iam_db import query
+
+REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+# Requests with a larger header block are rejected
+MAX_HEADER_BYTES = 16384
+
+
+def build_hash(connection: sqlite3.Connection) -> str:
+    """Identifies the contents of a database, from the content hash of each service"""
+    digest = hashlib.sha256()
+    for name, content_hash in connection.execute(
+        "SELECT name, content_hash FROM service ORDER BY name"
+    ):
+        digest.update(f"{name}\0{content_hash}\n".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class ConnectionPool:
+    """A fixed set of read-only connections shared by the worker threads"""
+
+    def __init__(self, db_path: str, size: int):
+        self._connections: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(size):
+            self._connections.put(query.connect(db_path, immutable=True))
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        connection = self._connections.get()
+        try:
+            yield connection
+        finally:
+            self._connections.put(connection)
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+
+class ResponseCache:
+    """Bounded LRU cache of encoded responses. Only used from the event loop."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.hits = self.misses = 0
+        self._entries: "OrderedDict[tuple, Tuple[int, bytes]]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[Tuple[int, bytes]]:
+        try:
+            response = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return response
+
+    def put(self, key: tuple, response: Tuple[int, bytes]):
+        if self.size <= 0:
+            return
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+def _limit(params: Dict[str, str]) -> Optional[int]:
+    if "limit" not in params:
+        return None
+    try:
+        return int(params["limit"])
+    except ValueError:
+        raise ValueError("limit must be an integer")
+
+
+def _dependent_actions(connection, params, name):
+    action = query.get_action(connection, name)
+    return None if action is None else action["dependent_actions"]
+
+
+def _search(connection, params):
+    if not params.get("q"):
+        raise ValueError("q is required")
+    table = params.get("table")
+    if table is not None and table not in query.SEARCH_TABLES:
+        raise ValueError(f"table must be one of {', '.join(query.SEARCH_TABLES)}")
+    return query.search(connection, params["q"], table, _limit(params) or 20)
+
+
+# Path patterns and the lookups answering them. Handlers receive the connection,
+# the query parameters and the path groups, and return None for not found.
+ROUTES: List[Tuple["re.Pattern", Callable]] = [
+    (
+        re.compile("/actions"),
+        lambda connection, params: query.find_actions(
+            connection, params.get("prefix"), params.get("access_level"), _limit(params)
+        ),
+    ),
+    (
+        re.compile("/actions/([^/]+)"),
+        lambda connection, params, name: query.get_action(connection, name),
+    ),
+    (re.compile("/actions/([^/]+)/dependent-actions"), _dependent_actions),
+    (
+        re.compile("/actions/([^/]+)/closure"),
+        lambda connection, params, name: query.get_action_closure(connection, name),
+    ),
+    (
+        re.compile("/resources"),
+        lambda connection, params: query.find_resources(
+            connection, params.get("name"), params.get("prefix"), _limit(params)
+        ),
+    ),
+    (
+        re.compile("/conditions"),
+        lambda connection, params: query.find_conditions(
+            connection, params.get("name"), params.get("prefix"), _limit(params)
+        ),
+    ),
+    (re.compile("/search"), _search),
+]
+
+
+class LookupServer:
+    def __init__(self, db_path: str, workers: int = 8, cache_size: int = 10000):
+        self.pool = ConnectionPool(db_path, workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.cache = ResponseCache(cache_size)
+        with self.pool.connection() as connection:
+            self.build_hash = build_hash(connection)
+        self.etag = f'"{self.build_hash}"'
+
+    def lookup(self, path: str, params: Dict[str, str]) -> Tuple[int, bytes]:
+        """Answers one request from the database. Runs in a worker thread."""
+        if path == "/":
+            return 200, json.dumps({"build": self.build_hash}).encode("utf-8")
+        for pattern, handler in ROUTES:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            with self.pool.connection() as connection:
+                try:
+                    result = handler(connection, params, *map(unquote, match.groups()))
+                except ValueError as error:
+                    return 400, json.dumps({"error": str(error)}).encode("utf-8")
+                except sqlite3.Error as error:
+                    # Databases built without FTS5, or by older versions, lack
+                    # the tables of some lookups
+                    if str(error).startswith("no such table"):
+                        status, message = 404, "not supported by this database"
+                    else:
+                        status, message = 500, str(error)
+                    return status, json.dumps({"error": message}).encode("utf-8")
+            if result is None:
+                break
+            return 200, json.dumps(result).encode("utf-8")
+        return 404, json.dumps({"error": "not found"}).encode("utf-8")
+
+    async def respond(self, target: str) -> Tuple[int, bytes]:
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        key = (url.path, tuple(sorted(params.items())))
+        response = self.cache.get(key)
+        if response is None:
+            response = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.lookup, url.path, params
+            )
+            if response[0] != 500:
+                self.cache.put(key, response)
+        return response
+
+    def encode(self, status: int, body: bytes, keep_alive: bool, head: bool) -> bytes:
+        lines = [
+            f"HTTP/1.1 {status} {REASONS[status]}",
+            f"ETag: {self.etag}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+        ]
+        header = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        return header if head else header + body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves the requests of one connection, keeping it open between them"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.split(" ")
+                    # Bodies are not used, but have to be read past
+                    await reader.readexactly(int(headers.get("content-length", 0)))
+                except ValueError:
+                    body = json.dumps({"error": "malformed request"}).encode("utf-8")
+                    writer.write(self.encode(400, body, False, False))
+                    break
+                connection = headers.get("connection", "").lower()
+                if version == "HTTP/1.1":
+                    keep_alive = connection != "close"
+                else:
+                    keep_alive = connection == "keep-alive"
+
+                if method not in ("GET", "HEAD"):
+                    status, body = 405, b'{"error": "method not allowed"}'
+                else:
+                    status, body = await self.respond(target)
+                    # Only found resources are revalidated, errors are sent again
+                    if status == 200 and self.etag in headers.get("if-none-match", ""):
+                        status, body = 304, b""
+                writer.write(self.encode(status, body, keep_alive, method == "HEAD"))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(
+            self.handle, host, port, limit=MAX_HEADER_BYTES, reuse_address=True
+        )
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
+        self.pool.close()
+
+
+def serve(
+    db_path: str,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    workers: int = 8,
+    cache_size: int = 10000,
+):
+    """Serves lookups until interrupted"""
+    server = LookupServer(db_path, workers, cache_size)
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
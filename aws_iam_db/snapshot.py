@@ -0,0 +1,323 @@
+"""Compact read-only snapshot of a database built by aws-iam-db.
+
+A snapshot holds the actions, resource types and condition keys in one binary
+file that is read with mmap. Loading it does no parsing, so opening a snapshot
+and answering a lookup takes well under a millisecond. This module only uses the
+standard library, so it can be copied next to a Lambda handler on its own.
+
+Layout, with every integer an unsigned 32-bit little-endian value:
+
+    header      MAGIC, VERSION and the offset and count of each section below
+    strings     offsets into the string data, one per string plus an end offset
+    data        UTF-8 text of every distinct string, stored once
+    lists       flat array of ids, referenced from records as (start, count)
+    action      records sorted by key, the lowercased action name
+    resource    records sorted by key, "prefix:resource-type"
+    condition   records sorted by key, the lowercased condition key name
+
+Record fields are string ids, list references or small integers, see the
+*_FIELDS tuples. A lookup is a binary search over the sorted keys of a table.
+"""
+
+import mmap
+import struct
+from bisect import bisect_left
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence
+
+MAGIC = b"IAMSNAP\0"
+VERSION = 1
+
+# Dependent actions are stored in the lists section as (name, resource) pairs
+ACTION_FIELDS = (
+    "key",
+    "name",
+    "description",
+    "access_level",
+    "prefix",
+    "resources_start",
+    "resources_count",
+    "dependents_start",
+    "dependents_count",
+)
+RESOURCE_FIELDS = (
+    "key",
+    "name",
+    "arn",
+    "required",
+    "prefix",
+    "conditions_start",
+    "conditions_count",
+)
+CONDITION_FIELDS = ("key", "name", "description", "type", "prefix")
+TABLES = (
+    ("action", ACTION_FIELDS),
+    ("resource", RESOURCE_FIELDS),
+    ("condition", CONDITION_FIELDS),
+)
+
+# MAGIC, VERSION, then (offset, count) for strings, data, lists and every table
+HEADER = struct.Struct("<8sI" + "II" * (3 + len(TABLES)))
+U32 = struct.Struct("<I")
+
+
+class _Writer:
+    """Accumulates the string pool and list section of a snapshot"""
+
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+        self.lists: List[int] = []
+
+    def string(self, value: Optional[str]) -> int:
+        value = value or ""
+        if value not in self.strings:
+            self.strings[value] = len(self.strings)
+        return self.strings[value]
+
+    def list(self, ids: Sequence[int]) -> tuple:
+        start = len(self.lists)
+        self.lists.extend(ids)
+        return start, len(ids)
+
+
+def _pack(values: Sequence[int]) -> bytes:
+    return struct.pack(f"<{len(values)}I", *values)
+
+
+def _sorted_rows(connection, sql: str, key) -> list:
+    """Runs a query, returning its rows sorted by key(row) with the key prepended"""
+    return sorted(
+        ((key(row),) + tuple(row) for row in connection.execute(sql)),
+        key=itemgetter(0),
+    )
+
+
+def export_snapshot(db_path: str, snapshot_path: str):
+    """Writes a snapshot of the database at db_path"""
+    # Imported here so that reading a snapshot does not load sqlite3
+    from pathlib import Path
+    import sqlite3
+
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    connection = sqlite3.connect(uri, uri=True)
+    try:
+        prefixes = dict(connection.execute("SELECT id, prefix FROM service"))
+        conditions = _sorted_rows(
+            connection,
+            "SELECT id, service_id, name, description, type FROM condition",
+            lambda row: row[2].lower(),
+        )
+        resources = _sorted_rows(
+            connection,
+            "SELECT id, service_id, name, arn, required FROM resource",
+            lambda row: f"{prefixes.get(row[1])}:{row[2]}",
+        )
+        actions = _sorted_rows(
+            connection,
+            "SELECT id, service_id, name, description, access_level FROM action",
+            lambda row: row[2].lower(),
+        )
+        # Record indexes replace database ids in the lists section
+        condition_index = {row[1]: i for i, row in enumerate(conditions)}
+        resource_index = {row[1]: i for i, row in enumerate(resources)}
+        resource_conditions: Dict[int, List[int]] = {}
+        for resource_id, condition_id in connection.execute(
+            "SELECT resource_id, condition_id FROM resource_condition"
+            " ORDER BY condition_id"
+        ):
+            resource_conditions.setdefault(resource_id, []).append(
+                condition_index[condition_id]
+            )
+        action_resources: Dict[int, List[int]] = {}
+        for action_id, resource_id in connection.execute(
+            "SELECT action_id, resource_id FROM action_resource ORDER BY resource_id"
+        ):
+            action_resources.setdefault(action_id, []).append(
+                resource_index[resource_id]
+            )
+        dependents = {}
+        for action_id, name, resource in connection.execute(
+            "SELECT action_id, name, resource FROM dependent_action ORDER BY id"
+        ):
+            dependents.setdefault(action_id, []).append((name, resource))
+    finally:
+        connection.close()
+
+    writer = _Writer()
+    string = writer.string
+    records = {
+        "condition": [
+            (string(key), string(name), string(description), string(type_))
+            + (string(prefixes.get(service_id)),)
+            for key, _, service_id, name, description, type_ in conditions
+        ],
+        "resource": [
+            (string(key), string(name), string(arn), int(bool(required)))
+            + (string(prefixes.get(service_id)),)
+            + writer.list(resource_conditions.get(id_, ()))
+            for key, id_, service_id, name, arn, required in resources
+        ],
+        "action": [
+            (string(key), string(name), string(description), string(access_level))
+            + (string(prefixes.get(service_id)),)
+            + writer.list(action_resources.get(id_, ()))
+            + writer.list(
+                [string(value) for pair in dependents.get(id_, ()) for value in pair]
+            )
+            for key, id_, service_id, name, description, access_level in actions
+        ],
+    }
+
+    encoded = [value.encode("utf-8") for value in writer.strings]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    sections = [_pack(offsets), b"".join(encoded), _pack(writer.lists)]
+    counts = [len(encoded), offsets[-1], len(writer.lists)]
+    for table, _ in TABLES:
+        sections.append(_pack([value for row in records[table] for value in row]))
+        counts.append(len(records[table]))
+
+    header = []
+    offset = HEADER.size
+    for section, count in zip(sections, counts):
+        header.extend((offset, count))
+        offset += len(section)
+    with open(snapshot_path, "wb") as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, VERSION, *header))
+        for section in sections:
+            snapshot_file.write(section)
+
+
+class _Table:
+    """Fixed-width records of a snapshot table, sorted by their first field"""
+
+    def __init__(self, snapshot: "Snapshot", fields: tuple, offset: int, count: int):
+        self.snapshot = snapshot
+        self.fields = fields
+        self.record = struct.Struct(f"<{len(fields)}I")
+        self.offset = offset
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> str:
+        # Indexing yields the keys, so bisect can search the table in place
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        key = U32.unpack_from(
+            self.snapshot.buffer, self.offset + index * self.record.size
+        )
+        return self.snapshot.string(key[0])
+
+    def row(self, index: int) -> dict:
+        values = self.record.unpack_from(
+            self.snapshot.buffer, self.offset + index * self.record.size
+        )
+        return dict(zip(self.fields, values))
+
+    def find(self, key: str) -> range:
+        """The indexes of the records with this key"""
+        start = bisect_left(self, key)
+        end = start
+        while end < self.count and self[end] == key:
+            end += 1
+        return range(start, end)
+
+
+class Snapshot:
+    """Memory-mapped reader of a snapshot written by export_snapshot"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as snapshot_file:
+            self.buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *sections = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise Exception(f"{path} is not a version {VERSION} aws-iam-db snapshot")
+        self._offsets, self.string_count = sections[0:2]
+        self._data = sections[2]
+        self._lists = sections[4]
+        self.tables = {
+            table: _Table(self, fields, *sections[6 + 2 * i : 8 + 2 * i])
+            for i, (table, fields) in enumerate(TABLES)
+        }
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def string(self, string_id: int) -> str:
+        start, end = struct.unpack_from(
+            "<2I", self.buffer, self._offsets + 4 * string_id
+        )
+        return str(self.buffer[self._data + start : self._data + end], "utf-8")
+
+    def list(self, start: int, count: int) -> tuple:
+        return struct.unpack_from(f"<{count}I", self.buffer, self._lists + 4 * start)
+
+    def _resource(self, index: int) -> dict:
+        row = self.tables["resource"].row(index)
+        conditions = self.tables["condition"]
+        return {
+            "prefix": self.string(row["prefix"]),
+            "name": self.string(row["name"]),
+            "arn": self.string(row["arn"]),
+            "required": bool(row["required"]),
+            "condition_keys": [
+                self.string(conditions.row(i)["name"])
+                for i in self.list(row["conditions_start"], row["conditions_count"])
+            ],
+        }
+
+    def get_action(self, name: str) -> Optional[dict]:
+        """Returns an action, e.g. "s3:GetObject", with its resource types and
+        dependent actions, or None. Names are matched case-insensitively."""
+        table = self.tables["action"]
+        found = table.find(name.lower())
+        if not found:
+            return None
+        row = table.row(found[0])
+        resources = []
+        for i in self.list(row["resources_start"], row["resources_count"]):
+            resource = self._resource(i)
+            del resource["prefix"]
+            resources.append(resource)
+        pairs = self.list(row["dependents_start"], row["dependents_count"])
+        return {
+            "name": self.string(row["name"]),
+            "description": self.string(row["description"]),
+            "access_level": self.string(row["access_level"]),
+            "prefix": self.string(row["prefix"]),
+            "resources": resources,
+            "dependent_actions": [
+                {"name": self.string(name), "resource": self.string(resource)}
+                for name, resource in zip(pairs[::2], pairs[1::2])
+            ],
+        }
+
+    def get_resource(self, prefix: str, name: str) -> Optional[dict]:
+        """Returns the resource type `name` of the service `prefix`, or None"""
+        found = self.tables["resource"].find(f"{prefix}:{name}")
+        return self._resource(found[0]) if found else None
+
+    def get_conditions(self, name: str) -> List[dict]:
+        """Returns the condition keys with this name, one per service documenting
+        it. Names are matched case-insensitively."""
+        table = self.tables["condition"]
+        conditions = []
+        for i in table.find(name.lower()):
+            row = table.row(i)
+            conditions.append(
+                {
+                    field: self.string(row[field])
+                    for field in ("prefix", "name", "description", "type")
+                }
+            )
+        return conditions
@@ -0,0 +1,83 @@
+"""Times PolicyAnalyzer over a corpus of synthetic IAM policies.
+
+Policies mix Allow and Deny statements using exact actions, wildcards and
+NotAction over a synthetic dataset of realistic size. Exits with status 1 if the
+analyzer handles fewer than --min-rate policies per second.
+
+    python benchmarks/bench_analyze.py
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from aws_iam_db.analyze import PolicyAnalyzer
+from aws_iam_db.expand import ActionIndex
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_expand import make_corpus  # noqa: E402
+from synthetic import make_services  # noqa: E402
+
+
+def make_policies(actions: list, count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    statements = make_corpus(actions, count * 3, seed)
+    policies = []
+    for _ in range(count):
+        policy = []
+        for _ in range(rng.randint(1, 4)):
+            effect = "Deny" if rng.random() < 0.2 else "Allow"
+            key = "NotAction" if rng.random() < 0.05 else "Action"
+            policy.append(
+                {"Effect": effect, key: rng.choice(statements), "Resource": "*"}
+            )
+        policies.append((f"policy{len(policies)}", {"Statement": policy}))
+    return policies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--policies", type=int, default=20000)
+    parser.add_argument("--min-rate", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    access_levels = {}
+    dependencies = {}
+    for service in make_services():
+        for privilege in service["privileges"]:
+            action = f"{service['prefix']}:{privilege['privilege']}"
+            access_levels[action] = privilege["access_level"]
+            for resource_type in privilege["resource_types"]:
+                dependencies.setdefault(action, []).extend(
+                    resource_type["dependent_actions"]
+                )
+    policies = make_policies(sorted(access_levels), args.policies)
+
+    start = time.perf_counter()
+    analyzer = PolicyAnalyzer(ActionIndex(access_levels), access_levels, dependencies)
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in analyzer.analyze_many(policies, list_actions=False):
+        pass
+    counts = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in analyzer.analyze_many(policies):
+        pass
+    listed = time.perf_counter() - start
+
+    rate = len(policies) / counts
+    print(f"{len(access_levels)} actions, {len(policies)} policies")
+    print(f"analyzer build         {built:8.3f}s")
+    print(f"counts only            {counts:8.3f}s  {rate:8.0f} policies/s")
+    print(f"with action lists      {listed:8.3f}s")
+    if rate < args.min_rate:
+        print(f"SLOW: fewer than {args.min_rate:.0f} policies/s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
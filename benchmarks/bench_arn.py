@@ -0,0 +1,186 @@
+"""Times matching a CloudTrail-sized batch of concrete ARNs with ArnMatcher.
+
+Builds ARN templates in the shapes the docs use, "type/${Id}", "type:${Name}",
+"type/${Path}${Name}", a bare "${Name}" and "${BucketName}/${ObjectName}", for
+the resource types of a synthetic dataset of realistic size, then matches ARNs
+filled in from them, with repeats as in real logs. A sample is checked against
+a scan of every template, and ARNs of real resource types that nest, like a
+DynamoDB table and its indexes, against the resource types they must match.
+Exits with status 1 if the matcher disagrees with either or matches fewer than
+--min-rate ARNs per second without its cache.
+
+    python benchmarks/bench_arn.py
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+from aws_iam_db.arn import ArnMatcher, compile_template
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import make_services  # noqa: E402
+
+SHAPES = (
+    "{region}:{account}:{resource}/${{{Resource}Id}}",
+    "{region}:{account}:{resource}:${{{Resource}Name}}",
+    ":{account}:{resource}/${{Path}}${{{Resource}Name}}",
+    "::${{{Resource}Name}}",
+    "::${{{Resource}Name}}/${{ObjectName}}",
+)
+PLACEHOLDER = re.compile(r"\$\{([^}]*)\}")
+# Templates of real resource types whose ARNs nest or contain "/", and ARNs with
+# the names of the resource types each must match, most specific first
+TEMPLATES = (
+    (
+        "dynamodb",
+        "table",
+        "arn:${Partition}:dynamodb:${Region}:${Account}:table/${TableName}",
+    ),
+    (
+        "dynamodb",
+        "index",
+        "arn:${Partition}:dynamodb:${Region}:${Account}:table/${TableName}/index/${IndexName}",
+    ),
+    (
+        "ec2",
+        "instance",
+        "arn:${Partition}:ec2:${Region}:${Account}:instance/${InstanceId}",
+    ),
+    ("iam", "role", "arn:${Partition}:iam::${Account}:role/${RoleNameWithPath}"),
+    (
+        "logs",
+        "log-group",
+        "arn:${Partition}:logs:${Region}:${Account}:log-group:${LogGroupName}",
+    ),
+    (
+        "logs",
+        "log-stream",
+        "arn:${Partition}:logs:${Region}:${Account}:log-group:${LogGroupName}:log-stream:${LogStreamName}",
+    ),
+    ("s3", "object", "arn:${Partition}:s3:::${BucketName}/${ObjectName}"),
+)
+CASES = (
+    ("arn:aws:dynamodb:us-east-1:1:table/T", ["table"]),
+    ("arn:aws:dynamodb:us-east-1:1:table/T/index/I", ["index"]),
+    ("arn:aws:ec2:us-east-1:1:instance/i-1", ["instance"]),
+    ("arn:aws:ec2:us-east-1:1:instance/i-1/anything", []),
+    ("arn:aws:iam::1:role/team/service/deploy", ["role"]),
+    ("arn:aws:logs:us-east-1:1:log-group:/aws/lambda/fn", ["log-group"]),
+    ("arn:aws:logs:us-east-1:1:log-group:/aws/lambda/fn:log-stream:s", ["log-stream"]),
+    ("arn:aws:s3:::bucket/a/b:c.txt", ["object"]),
+)
+
+
+def make_resource_types(seed: int = 0) -> list:
+    rng = random.Random(seed)
+    resource_types = []
+    for service in make_services():
+        for resource in service["resources"]:
+            name = resource["resource"]
+            shape = rng.choice(SHAPES).format(
+                region="${Region}",
+                account="${Account}",
+                resource=name,
+                Resource=name.title(),
+            )
+            arn = f"arn:${{Partition}}:{service['prefix']}:{shape}"
+            resource_types.append(
+                {"prefix": service["prefix"], "name": name, "arn": arn}
+            )
+    resource_types.extend(
+        {"prefix": prefix, "name": name, "arn": arn} for prefix, name, arn in TEMPLATES
+    )
+    return resource_types
+
+
+def fill(template: str, rng: random.Random) -> str:
+    def value(placeholder: "re.Match") -> str:
+        name = placeholder.group(1)
+        if name == "Partition":
+            return "aws"
+        if name == "Region":
+            return rng.choice(["us-east-1", "eu-west-1", "ap-south-1"])
+        if name == "Account":
+            return str(rng.randrange(10**11, 10**12))
+        if name == "Path":
+            return rng.choice(["", "team/", "team/service/"])
+        if name == "ObjectName":
+            return "/".join(
+                f"key{rng.randrange(1000)}" for _ in range(rng.randint(1, 3))
+            )
+        return f"{name.lower()[:4]}-{rng.randrange(16**8):08x}"
+
+    return PLACEHOLDER.sub(value, template)
+
+
+def make_arns(resource_types: list, count: int, distinct: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    pool = [fill(rng.choice(resource_types)["arn"], rng) for _ in range(distinct)]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arns", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=50000)
+    parser.add_argument("--sample", type=int, default=2000)
+    parser.add_argument("--min-rate", type=float, default=100000.0)
+    args = parser.parse_args()
+
+    resource_types = make_resource_types()
+    arns = make_arns(resource_types, args.arns, args.distinct)
+
+    start = time.perf_counter()
+    matcher = ArnMatcher(resource_types)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    matcher.match_many(arns)
+    cold = time.perf_counter() - start
+
+    uncached = ArnMatcher(resource_types, cache_size=0)
+    start = time.perf_counter()
+    uncached.match_many(arns)
+    no_cache = time.perf_counter() - start
+
+    patterns = [
+        (compile_template(resource_type["arn"]), resource_type)
+        for resource_type in resource_types
+    ]
+    sample = arns[: args.sample]
+    start = time.perf_counter()
+    scanned = {
+        arn: {id(rt) for pattern, rt in patterns if pattern.fullmatch(arn)}
+        for arn in sample
+    }
+    scan = time.perf_counter() - start
+    wrong = [
+        arn for arn in sample if {id(rt) for rt in matcher.match(arn)} != scanned[arn]
+    ]
+    wrong += [
+        arn
+        for arn, names in CASES
+        if [resource_type["name"] for resource_type in matcher.match(arn)] != names
+    ]
+
+    rate = len(arns) / no_cache
+    print(
+        f"{len(resource_types)} templates, {len(arns)} ARNs, {args.distinct} distinct"
+    )
+    print(f"index build        {built:8.3f}s")
+    print(f"match, cached      {cold:8.3f}s  {len(arns) / cold:10.0f} ARNs/s")
+    print(f"match, no cache    {no_cache:8.3f}s  {rate:10.0f} ARNs/s")
+    print(f"scan all templates {scan:8.3f}s  {len(sample) / scan:10.0f} ARNs/s")
+    if wrong:
+        print(f"WRONG: {len(wrong)} ARNs matched differently than expected")
+    if rate < args.min_rate:
+        print(f"SLOW: fewer than {args.min_rate:.0f} ARNs/s")
+    if wrong or rate < args.min_rate:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Compares dependent action closure lookups with a recursive CTE.
+
+Builds a synthetic database of realistic size, with extra dependent actions
+across services so that dependencies chain several levels deep, and looks up
+the full set of actions needed by --lookups random actions twice: from the
+materialized action_closure table, and with a recursive CTE following
+dependent_action by name as reads had to before. Actions with any dependencies
+and those with chains at least --deep long are timed separately. Exits with
+status 1 if the two disagree on any action.
+
+    python benchmarks/bench_closure.py
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from aws_iam_db import query
+from aws_iam_db.build_db import build
+from aws_iam_db.metrics import Metrics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import make_services  # noqa: E402
+
+RECURSIVE_CTE = """
+WITH RECURSIVE needed(name) AS (
+    SELECT d.name FROM dependent_action d JOIN action a ON a.id = d.action_id
+    WHERE a.name = ?
+    UNION
+    SELECT d.name FROM needed n JOIN action a ON a.name = n.name
+    JOIN dependent_action d ON d.action_id = a.id
+)
+SELECT name FROM needed
+"""
+
+
+def add_dependencies(services: list, probability: float, seed: int = 0):
+    """Gives resource types of random actions dependent actions in any service"""
+    rng = random.Random(seed)
+    actions = [
+        f"{service['prefix']}:{privilege['privilege']}"
+        for service in services
+        for privilege in service["privileges"]
+    ]
+    for service in services:
+        for privilege in service["privileges"]:
+            for resource_type in privilege["resource_types"]:
+                if rng.random() < probability:
+                    resource_type["dependent_actions"] += rng.sample(
+                        actions, rng.randint(1, 2)
+                    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--probability", type=float, default=0.3)
+    parser.add_argument("--deep", type=int, default=6)
+    args = parser.parse_args()
+
+    services = make_services()
+    add_dependencies(services, args.probability)
+    db_path = os.path.join(tempfile.mkdtemp(), "iam.db")
+    metrics = Metrics()
+    build(services, db_path, progress=False, metrics=metrics)
+    closure = metrics.report()["tables"]["action_closure"]
+
+    connection = query.connect(db_path)
+    depth = connection.execute("SELECT max(depth) FROM action_closure").fetchone()[0]
+    print(
+        f"{closure['rows']} closure rows up to {depth} deep,"
+        f" built in {closure['seconds']:.3f}s"
+    )
+    wrong = []
+    for label, min_depth in (("with dependencies", 1), ("deep", args.deep)):
+        actions = [
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM action WHERE id IN"
+                " (SELECT action_id FROM action_closure WHERE depth >= ?)",
+                (min_depth,),
+            )
+        ]
+        if not actions:
+            continue
+        sample = random.Random(1).choices(actions, k=args.lookups)
+
+        start = time.perf_counter()
+        materialized = {
+            name: {row["name"] for row in query.get_action_closure(connection, name)}
+            for name in sample
+        }
+        table = time.perf_counter() - start
+        start = time.perf_counter()
+        recursive = {
+            name: {row[0] for row in connection.execute(RECURSIVE_CTE, (name,))}
+            - {name}
+            for name in sample
+        }
+        cte = time.perf_counter() - start
+
+        wrong += [name for name in sample if materialized[name] != recursive[name]]
+        print(f"{len(actions)} actions {label}, depth >= {min_depth}")
+        print(f"  action_closure  {table:8.3f}s  {len(sample) / table:9.0f} lookups/s")
+        print(f"  recursive CTE   {cte:8.3f}s  {len(sample) / cte:9.0f} lookups/s")
+    connection.close()
+    if wrong:
+        print(f"WRONG: {len(wrong)} actions have a different closure, e.g. {wrong[0]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
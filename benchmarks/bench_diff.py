@@ -0,0 +1,137 @@
+"""Times diffing two builds, and exporting one to Parquet and Arrow.
+
+Builds a synthetic database of realistic size and a second one from a copy of
+its services with --changed of them edited: an action added, one removed, one
+re-described and one condition key given another type each, plus one service
+added and one removed. Times diff_databases, which skips services with the same
+content hash, against hashing every row of both builds, and checks the diff
+finds exactly the edits. Then times export_database in both formats and reading
+the action table back with pyarrow against loading it through the ORM. Exits
+with status 1 if the diff is wrong.
+
+    python benchmarks/bench_diff.py
+"""
+
+import argparse
+import copy
+import os
+import random
+import sys
+import tempfile
+import time
+
+from aws_iam_db import query
+from aws_iam_db.build_db import Action, build, connect
+from aws_iam_db.diff import _action_hashes, _condition_hashes, diff_databases
+from aws_iam_db.export import export_database
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import make_service, make_services  # noqa: E402
+
+
+def edit(services: list, changed: int, seed: int = 0) -> dict:
+    """Edits services in place, returning the changes a diff should find"""
+    rng = random.Random(seed)
+    expected = {"added": [], "removed": [], "changed": [], "conditions": []}
+    for service in rng.sample(services, changed):
+        prefix = service["prefix"]
+        privileges = service["privileges"]
+        removed = privileges.pop(rng.randrange(len(privileges)))
+        expected["removed"].append(f"{prefix}:{removed['privilege']}")
+        added = dict(copy.deepcopy(privileges[0]), privilege="BenchmarkAddedAction")
+        privileges.append(added)
+        expected["added"].append(f"{prefix}:BenchmarkAddedAction")
+        privilege = rng.choice(privileges[:-1])
+        privilege["description"] += " Edited."
+        expected["changed"].append(f"{prefix}:{privilege['privilege']}")
+        condition = rng.choice(service["conditions"])
+        condition["type"] = "Numeric" if condition["type"] != "Numeric" else "Bool"
+        expected["conditions"].append((prefix, condition["condition"]))
+    removed_service = services.pop()
+    expected["removed"] += [
+        f"{removed_service['prefix']}:{privilege['privilege']}"
+        for privilege in removed_service["privileges"]
+    ]
+    added_service = make_service(len(services) + 1000)
+    services.append(added_service)
+    expected["added"] += [
+        f"{added_service['prefix']}:{privilege['privilege']}"
+        for privilege in added_service["privileges"]
+    ]
+    return expected
+
+
+def hash_everything(db_path: str) -> tuple:
+    connection = query.connect(db_path)
+    ids = [row[0] for row in connection.execute("SELECT id FROM service")]
+    hashes = _action_hashes(connection, ids), _condition_hashes(connection, ids)
+    connection.close()
+    return hashes
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--changed", type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    old_path = os.path.join(directory, "old.db")
+    new_path = os.path.join(directory, "new.db")
+    services = make_services()
+    build(services, old_path, progress=False)
+    expected = edit(services, args.changed)
+    build(services, new_path, progress=False)
+
+    seconds, result = timed(diff_databases, old_path, new_path)
+    everything, _ = timed(
+        lambda: (hash_everything(old_path), hash_everything(new_path))
+    )
+    print(f"diff                {seconds:8.3f}s")
+    print(f"hash every row      {everything:8.3f}s")
+
+    actions = result["actions"]
+    problems = []
+    for key in ("added", "removed"):
+        if sorted(actions[key]) != sorted(expected[key]):
+            problems.append(f"{key} actions")
+    if sorted(change["name"] for change in actions["changed"]) != sorted(
+        expected["changed"]
+    ):
+        problems.append("changed actions")
+    found = sorted(
+        (change["prefix"], change["name"])
+        for change in result["condition_keys"]["changed"]
+        if change["fields"] == ["type"]
+    )
+    if found != sorted(expected["conditions"]):
+        problems.append("changed condition keys")
+
+    for format in ("parquet", "arrow"):
+        seconds, paths = timed(
+            export_database, new_path, os.path.join(directory, format), format
+        )
+        size = sum(os.path.getsize(path) for path in paths.values())
+        print(f"export {format:12} {seconds:8.3f}s  {size / 2**20:6.1f}MB")
+
+    import pyarrow.parquet
+
+    action_file = os.path.join(directory, "parquet", "action.parquet")
+    seconds, table = timed(pyarrow.parquet.read_table, action_file)
+    print(f"read actions, parquet {seconds:6.3f}s  {table.num_rows} rows")
+    session, _ = connect(new_path)
+    seconds, rows = timed(lambda: session.query(Action).all())
+    print(f"read actions, ORM     {seconds:6.3f}s  {len(rows)} rows")
+
+    if problems:
+        print(f"WRONG: {', '.join(problems)} differ from the edits")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
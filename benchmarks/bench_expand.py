@@ -0,0 +1,84 @@
+"""Times wildcard expansion of a 10k statement policy corpus with ActionIndex.
+
+The corpus mixes exact actions with prefix (s3:Get*), infix (ec2:*Instance*) and
+cross-service (*:List*) patterns over a synthetic dataset of realistic size.
+Exits with status 1 if expanding the corpus with a fresh index takes longer than
+--max-seconds.
+
+    python benchmarks/bench_expand.py
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from aws_iam_db.expand import ActionIndex
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import NOUNS, VERBS, make_services  # noqa: E402
+
+
+def make_corpus(actions: list, statements: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    prefixes = sorted({action.split(":")[0] for action in actions})
+    templates = [
+        lambda: rng.choice(actions),
+        lambda: rng.choice(actions),
+        lambda: f"{rng.choice(prefixes)}:{rng.choice(VERBS)}*",
+        lambda: f"{rng.choice(prefixes)}:*{rng.choice(NOUNS)}*",
+        lambda: f"{rng.choice(prefixes)}:*",
+        lambda: f"*:{rng.choice(VERBS)}*",
+        lambda: f"{rng.choice(prefixes)}:?et{rng.choice(NOUNS)}",
+    ]
+    return [
+        [rng.choice(templates)() for _ in range(rng.randint(1, 4))]
+        for _ in range(statements)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, default=10000)
+    parser.add_argument("--max-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    actions = [
+        f"{service['prefix']}:{privilege['privilege']}"
+        for service in make_services()
+        for privilege in service["privileges"]
+    ]
+    corpus = make_corpus(actions, args.statements)
+    patterns = sum(len(statement) for statement in corpus)
+
+    start = time.perf_counter()
+    index = ActionIndex(actions)
+    built = time.perf_counter() - start
+    for statement in corpus:
+        index.expand_many(statement)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for statement in corpus:
+        index.expand_many(statement)
+    warm = time.perf_counter() - start
+
+    uncached = ActionIndex(actions, cache_size=0)
+    start = time.perf_counter()
+    for statement in corpus:
+        uncached.expand_many(statement)
+    no_cache = time.perf_counter() - start
+
+    print(f"{len(actions)} actions, {args.statements} statements, {patterns} patterns")
+    print(f"index build            {built:8.3f}s")
+    print(f"cold (build + expand)  {cold:8.3f}s  {index.cache_info()}")
+    print(f"warm cache             {warm:8.3f}s")
+    print(f"without cache          {no_cache:8.3f}s")
+    if cold > args.max_seconds:
+        print(f"SLOW: cold expansion took more than {args.max_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Times each stage of the pipeline against the offline docs corpus.
+
+Serves benchmarks/fixtures with fixture_server and runs download, parse, JSON
+write and database build into a temporary directory, reporting each stage's
+best time over --rounds runs, its throughput in pages/s and rows/s, and its peak
+Python memory, from one more run traced with tracemalloc.
+
+With --save-baseline the results are written to --baseline. Otherwise the run
+exits with status 1 when a stage's throughput drops, or its peak memory grows, by
+more than --threshold relative to the baseline. Without a baseline nothing is
+compared: that is a warning for the default file, and a failure for one passed as
+--baseline. Baselines depend on the machine, so record one before a change and
+compare after it:
+
+    python benchmarks/bench_pipeline.py --save-baseline
+    python benchmarks/bench_pipeline.py
+"""
+
+import argparse
+from contextlib import redirect_stdout
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from aws_iam_db.build_db import build
+from aws_iam_db.docs import parse_docs, update_html_docs_directory
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fixture_server import start_server  # noqa: E402
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "pipeline_baseline.json"
+)
+STAGES = ("download", "parse", "json", "build")
+# Growth in peak memory below this is noise rather than a regression
+MEMORY_SLACK_MB = 1.0
+
+
+def service_rows(services: list) -> int:
+    return sum(
+        len(service["privileges"])
+        + len(service["resources"])
+        + len(service["conditions"])
+        for service in services
+    )
+
+
+def database_rows(db_path: str) -> int:
+    connection = sqlite3.connect(db_path)
+    tables = [
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+            " AND name NOT LIKE 'search%' AND name NOT LIKE 'sqlite%'"
+        )
+    ]
+    rows = sum(
+        connection.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+        for table in tables
+    )
+    connection.close()
+    return rows
+
+
+def run_stages(url: str, jobs: int, parser: str, traced: bool) -> dict:
+    """Runs the pipeline once, returning per stage (seconds, pages, rows, peak)"""
+    directory = tempfile.mkdtemp() + "/"
+    results = {}
+
+    def stage(name, function, *args):
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            result = function(*args)
+        seconds = time.perf_counter() - start
+        peak = 0
+        if traced:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results[name] = [seconds, peak]
+        return result
+
+    manifest = stage(
+        "download", update_html_docs_directory, directory, 8, 0.0, url, True
+    )
+    services = stage(
+        "parse", lambda: list(parse_docs(directory, manifest, jobs, parser))
+    )
+    json_path = directory + "iam.json"
+
+    def write_json():
+        with open(json_path, "w") as out_file:
+            json.dump(services, out_file, indent=2, sort_keys=True)
+
+    stage("json", write_json)
+    db_path = directory + "iam.db"
+    stage("build", build, services, db_path, False)
+
+    pages = len(manifest["pages"])
+    rows = service_rows(services)
+    counts = {
+        "download": (pages, 0),
+        "parse": (pages, rows),
+        "json": (pages, rows),
+        "build": (pages, database_rows(db_path)),
+    }
+    return {
+        name: (seconds, *counts[name], peak)
+        for name, (seconds, peak) in results.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--parser", default="auto")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument(
+        "--baseline", help=f"Baseline file, defaults to {BASELINE_PATH}"
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    server, url = start_server()
+    runs = [run_stages(url, args.jobs, args.parser, False) for _ in range(args.rounds)]
+    traced = run_stages(url, args.jobs, args.parser, True)
+    server.shutdown()
+
+    report = {}
+    for name in STAGES:
+        seconds, pages, rows, _ = min(run[name] for run in runs)
+        report[name] = {
+            "seconds": round(seconds, 4),
+            "pages_per_second": round(pages / seconds, 1),
+            "rows_per_second": round(rows / seconds, 1),
+            "peak_mb": round(traced[name][3] / 2**20, 2),
+        }
+        print(
+            f"{name:9} {seconds:8.3f}s {pages / seconds:9.1f} pages/s"
+            f" {rows / seconds:11.0f} rows/s {report[name]['peak_mb']:8.1f}MB peak"
+        )
+
+    baseline_path = args.baseline or BASELINE_PATH
+    if args.save_baseline:
+        with open(baseline_path, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+        return
+    if not os.path.isfile(baseline_path):
+        if args.baseline:
+            print(f"MISSING: no baseline at {baseline_path}")
+            sys.exit(1)
+        print(
+            f"WARNING: no baseline at {baseline_path}, nothing was compared."
+            " Record one with --save-baseline."
+        )
+        return
+    with open(baseline_path, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = []
+    for name, expected in baseline.items():
+        actual = report[name]
+        for key in ("pages_per_second", "rows_per_second"):
+            if actual[key] < expected[key] * (1 - args.threshold):
+                regressions.append(f"{name} {key} {actual[key]} < {expected[key]}")
+        limit = expected["peak_mb"] * (1 + args.threshold) + MEMORY_SLACK_MB
+        if actual["peak_mb"] > limit:
+            regressions.append(
+                f"{name} peak_mb {actual['peak_mb']} > {expected['peak_mb']}"
+            )
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
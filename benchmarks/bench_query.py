@@ -0,0 +1,108 @@
+"""Times the lookups in aws_iam_db.query against a full-size database.
+
+Builds a synthetic database of realistic size unless --db-path points at an
+existing one, then runs every lookup --iterations times with random arguments.
+Exits with status 1 if the median time of any lookup is above --max-ms. Ranked
+search scores every match and is reported for reference only.
+
+    python benchmarks/bench_query.py [--db-path iam.db]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from aws_iam_db import query
+from aws_iam_db.build_db import build
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import make_services  # noqa: E402
+
+
+def measure(function, arguments) -> list:
+    timings = []
+    for args in arguments:
+        start = time.perf_counter()
+        function(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", help="existing database to benchmark")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--max-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    db_path = args.db_path
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), "iam.db")
+        build(make_services(), db_path, progress=False)
+
+    connection = query.connect(db_path)
+    rng = random.Random(0)
+    actions = [row[0] for row in connection.execute("SELECT name FROM action")]
+    prefixes = [row[0] for row in connection.execute("SELECT prefix FROM service")]
+    resources = [row[0] for row in connection.execute("SELECT name FROM resource")]
+    conditions = [row[0] for row in connection.execute("SELECT name FROM condition")]
+    words = ["bucket", "snapshot", "replication configuration", "encryption key"]
+    n = args.iterations
+    pick = rng.choice
+
+    lookups = {
+        "get_action": (
+            query.get_action,
+            [(connection, pick(actions).lower()) for _ in range(n)],
+        ),
+        "find_actions(prefix)": (
+            query.find_actions,
+            [(connection, pick(prefixes)) for _ in range(n)],
+        ),
+        "find_actions(prefix, access_level)": (
+            query.find_actions,
+            [(connection, pick(prefixes), "Write") for _ in range(n)],
+        ),
+        "find_actions(access_level, limit=50)": (
+            query.find_actions,
+            [(connection, None, "Read", 50) for _ in range(n)],
+        ),
+        "find_resources(name)": (
+            query.find_resources,
+            [(connection, pick(resources)) for _ in range(n)],
+        ),
+        "find_conditions(name, prefix)": (
+            query.find_conditions,
+            [(connection, pick(conditions), pick(prefixes)) for _ in range(n)],
+        ),
+        "search(limit=20)": (
+            query.search,
+            [(connection, pick(words), None, 20) for _ in range(n)],
+        ),
+        "search(limit=20, ranked=True)": (
+            query.search,
+            [(connection, pick(words), None, 20, True) for _ in range(n)],
+        ),
+    }
+    informational = {"search(limit=20, ranked=True)"}
+
+    print(f"{len(actions)} actions in {len(prefixes)} services, {n} iterations")
+    print(f"{'lookup':40} {'median ms':>10} {'p95 ms':>10}")
+    failed = False
+    for name, (function, arguments) in lookups.items():
+        timings = sorted(measure(function, arguments))
+        median = statistics.median(timings)
+        p95 = timings[int(len(timings) * 0.95)]
+        slow = median > args.max_ms and name not in informational
+        failed |= slow
+        flag = "  SLOW" if slow else ""
+        print(f"{name:40} {median:10.3f} {p95:10.3f}{flag}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
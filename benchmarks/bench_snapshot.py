@@ -0,0 +1,108 @@
+"""Times a cold start with a snapshot against the same lookup through the database.
+
+Builds a synthetic database of realistic size unless --db-path points at an
+existing one and exports it to a snapshot. Then each of --runs fresh Python
+processes imports the reader, opens the snapshot and looks up one action, and as
+many more do the same with the SQLAlchemy models. Exits with status 1 if the
+median snapshot cold start, measured inside the process, is above --max-ms.
+
+    python benchmarks/bench_snapshot.py [--db-path iam.db]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from aws_iam_db.build_db import build
+from aws_iam_db.snapshot import Snapshot, export_snapshot
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import make_services  # noqa: E402
+
+SNAPSHOT_LOOKUP = """
+import json, sys, time
+start = time.perf_counter()
+from aws_iam_db.snapshot import Snapshot
+snapshot = Snapshot(sys.argv[1])
+assert snapshot.get_action(sys.argv[2])
+print(json.dumps((time.perf_counter() - start) * 1000))
+"""
+
+ORM_LOOKUP = """
+import json, sys, time
+start = time.perf_counter()
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from aws_iam_db.build_db import Action
+session = sessionmaker(bind=create_engine("sqlite:///" + sys.argv[1]))()
+action = session.query(Action).filter(Action.name == sys.argv[2]).first()
+assert action.resources is not None and action.dependent_actions is not None
+print(json.dumps((time.perf_counter() - start) * 1000))
+"""
+
+
+def cold_starts(script: str, path: str, action: str, runs: int) -> list:
+    return [
+        json.loads(
+            subprocess.run(
+                [sys.executable, "-c", script, path, action],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        )
+        for _ in range(runs)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", help="existing database to benchmark")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--max-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    db_path = args.db_path
+    if db_path is None:
+        db_path = os.path.join(directory, "iam.db")
+        build(make_services(), db_path, progress=False)
+    snapshot_path = os.path.join(directory, "iam.snapshot")
+    start = time.perf_counter()
+    export_snapshot(db_path, snapshot_path)
+    exported = time.perf_counter() - start
+
+    with Snapshot(snapshot_path) as snapshot:
+        action = snapshot.get_action(
+            snapshot.string(snapshot.tables["action"].row(0)["key"])
+        )
+        name = action["name"]
+        start = time.perf_counter()
+        for _ in range(1000):
+            snapshot.get_action(name)
+        warm = (time.perf_counter() - start) * 1000
+
+    snapshot_ms = statistics.median(
+        cold_starts(SNAPSHOT_LOOKUP, snapshot_path, name, args.runs)
+    )
+    orm_ms = statistics.median(cold_starts(ORM_LOOKUP, db_path, name, args.runs))
+
+    print(
+        f"snapshot: {os.path.getsize(snapshot_path)} bytes, exported in {exported:.3f}s"
+    )
+    print(f"database: {os.path.getsize(db_path)} bytes")
+    print(f"cold start, snapshot  {snapshot_ms:8.2f}ms")
+    print(f"cold start, ORM       {orm_ms:8.2f}ms")
+    print(f"warm get_action       {warm / 1000:8.4f}ms")
+    if snapshot_ms > args.max_ms:
+        print(f"SLOW: snapshot cold start took more than {args.max_ms}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
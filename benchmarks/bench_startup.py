@@ -0,0 +1,95 @@
+"""Times the startup of the aws-iam-db command line.
+
+Runs `--help` and the read-only commands --runs times each in fresh processes,
+against a small synthetic database unless --db-path points at an existing one.
+Exits with status 1 if importing the CLI loads any of HEAVY_MODULES, or if the
+median wall time of any command is above --max-ms.
+
+    python benchmarks/bench_startup.py [--db-path iam.db]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import make_services  # noqa: E402
+
+# Only the commands that download, parse or build should import these
+HEAVY_MODULES = ("sqlalchemy", "bs4", "requests", "lxml")
+
+
+def loaded_heavy_modules() -> list:
+    script = (
+        "import json, sys, aws_iam_db.__main__; print(json.dumps(list(sys.modules)))"
+    )
+    modules = json.loads(
+        subprocess.run(
+            [sys.executable, "-c", script], check=True, capture_output=True, text=True
+        ).stdout
+    )
+    return sorted({module.split(".")[0] for module in modules} & set(HEAVY_MODULES))
+
+
+def wall_times(command: list, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", help="existing database to benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    db_path = args.db_path
+    if db_path is None:
+        from aws_iam_db.build_db import build
+
+        db_path = os.path.join(tempfile.mkdtemp(), "iam.db")
+        build(make_services(20), db_path, progress=False)
+
+    from aws_iam_db import query
+
+    connection = query.connect(db_path)
+    action = connection.execute("SELECT name FROM action LIMIT 1").fetchone()[0]
+    connection.close()
+    commands = {
+        "--help": ["--help"],
+        "query ACTION": ["query", action, "--db-path", db_path],
+        "query --search": ["query", "--search", "bucket", "--db-path", db_path],
+        "expand PATTERN": ["expand", action.split(":")[0] + ":*", "--db-path", db_path],
+    }
+
+    heavy = loaded_heavy_modules()
+    if heavy:
+        print(f"importing the CLI loads {', '.join(heavy)}")
+    interpreter = statistics.median(
+        wall_times([sys.executable, "-c", "pass"], args.runs)
+    )
+    print(f"{'python -c pass':20} {interpreter:8.1f}ms")
+    slow = []
+    for label, arguments in commands.items():
+        command = [sys.executable, "-m", "aws_iam_db"] + arguments
+        median = statistics.median(wall_times(command, args.runs))
+        print(f"{label:20} {median:8.1f}ms")
+        if median > args.max_ms:
+            slow.append(label)
+    if slow:
+        print(f"SLOW: {', '.join(slow)} took more than {args.max_ms}ms")
+    if heavy or slow:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Serves a directory of docs pages over HTTP, standing in for docs.aws.amazon.com.
+
+Pages are served with Last-Modified headers and answer If-Modified-Since with 304,
+so conditional downloads behave as against the real docs host.
+
+    python benchmarks/fixture_server.py [--port 8765] [benchmarks/fixtures]
+"""
+
+import argparse
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+
+FIXTURES_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fixtures"
+)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(directory: str = FIXTURES_DIRECTORY, port: int = 0):
+    """Serves `directory` from a background thread, returning the server and the
+    URL prefix of the pages. Port 0 picks a free port."""
+    handler = partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", nargs="?", default=FIXTURES_DIRECTORY)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server, url = start_server(args.directory, args.port)
+    print(f"Serving {args.directory} at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
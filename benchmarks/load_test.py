@@ -0,0 +1,154 @@
+"""Load tests `aws-iam-db serve`.
+
+Starts the server on a free port against a synthetic database, unless --db-path
+points at an existing one or --url at a running server, then keeps --connections
+keep-alive connections busy for --seconds with GETs of random actions, searches
+and listings. Reports requests per second and latency percentiles, and exits
+with status 1 on any error response or when the rate is below --min-rps.
+
+    python benchmarks/load_test.py [--db-path iam.db] [--connections 64]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote, urlsplit
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import make_services  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_server(db_path: str, workers: int) -> tuple:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "aws_iam_db", "serve", "--db-path", db_path]
+        + ["--port", str(port), "--workers", str(workers)],
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            urllib.request.urlopen(url + "/").read()
+            return process, url
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise Exception("aws-iam-db serve did not start")
+            time.sleep(0.05)
+
+
+def request_paths(db_path: str, count: int, seed: int = 0) -> list:
+    """A mix of lookups, mostly of single actions as a policy tool would make"""
+    from aws_iam_db import query
+
+    connection = query.connect(db_path)
+    actions = [row[0] for row in connection.execute("SELECT name FROM action")]
+    prefixes = [row[0] for row in connection.execute("SELECT prefix FROM service")]
+    connection.close()
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.8:
+            paths.append("/actions/" + quote(rng.choice(actions), safe=""))
+        elif roll < 0.9:
+            paths.append(f"/actions?prefix={rng.choice(prefixes)}&limit=50")
+        else:
+            word = rng.choice(actions).split(":")[1][:6]
+            paths.append(f"/search?q={quote(word)}&limit=10")
+    return paths
+
+
+async def client(host: str, port: int, paths: list, until: float, results: dict):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < until:
+            path = random.choice(paths)
+            start = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            results["latencies"].append(time.perf_counter() - start)
+            if not head.startswith(b"HTTP/1.1 200"):
+                results["errors"] += 1
+    finally:
+        writer.close()
+
+
+async def load(url: str, paths: list, connections: int, seconds: float) -> dict:
+    location = urlsplit(url)
+    results = {"latencies": [], "errors": 0}
+    until = time.perf_counter() + seconds
+    await asyncio.gather(
+        *(
+            client(location.hostname, location.port, paths, until, results)
+            for _ in range(connections)
+        )
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", help="existing database to serve")
+    parser.add_argument("--url", help="running server to test, needs --db-path")
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--paths", type=int, default=5000, help="distinct requests")
+    parser.add_argument("--min-rps", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    db_path = args.db_path
+    if db_path is None:
+        if args.url:
+            parser.error("--url needs --db-path to pick the requests")
+        from aws_iam_db.build_db import build
+
+        db_path = os.path.join(tempfile.mkdtemp(), "iam.db")
+        build(make_services(), db_path, progress=False)
+    paths = request_paths(db_path, args.paths)
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(db_path, args.workers)
+    try:
+        results = asyncio.run(load(url, paths, args.connections, args.seconds))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    latencies = sorted(results["latencies"])
+    rate = len(latencies) / args.seconds
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+    print(
+        f"{len(latencies)} requests, {rate:.0f} requests/s, p50"
+        f" {percentile(0.5) * 1000:.2f}ms, p99 {percentile(0.99) * 1000:.2f}ms,"
+        f" {results['errors']} errors"
+    )
+    if results["errors"] or rate < args.min_rps:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
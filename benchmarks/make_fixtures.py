@@ -0,0 +1,381 @@
+"""Generates the docs pages in benchmarks/fixtures.
+
+The pages use the markup of the Service Authorization Reference: the actions,
+resource types and condition keys tables, rowspans, permission-only actions,
+dependent actions, the EC2 RunInstances scenario rows and descriptions with
+inline <code>, <a> and <b> elements, plus the index page linking them. Sizes
+follow the real services, EC2 being the largest page. The output is
+deterministic, so the corpus only changes when this script does.
+
+    python benchmarks/make_fixtures.py benchmarks/fixtures
+"""
+
+import random
+import sys
+from html import escape
+from pathlib import Path
+
+ACCESS = ["List", "Read", "Write", "Permissions management", "Tagging"]
+VERBS = [
+    "Create",
+    "Delete",
+    "Describe",
+    "Get",
+    "List",
+    "Put",
+    "Update",
+    "Modify",
+    "Start",
+    "Stop",
+    "Tag",
+    "Untag",
+    "Attach",
+    "Detach",
+]
+NOUNS = [
+    "Instance",
+    "Volume",
+    "Snapshot",
+    "Bucket",
+    "Object",
+    "Policy",
+    "Role",
+    "Key",
+    "Alias",
+    "Group",
+    "Rule",
+    "Table",
+    "Stream",
+    "Function",
+    "Layer",
+    "Queue",
+    "Topic",
+    "Endpoint",
+    "Cluster",
+    "Image",
+    "Vpc",
+    "Subnet",
+    "Route",
+    "Gateway",
+    "Certificate",
+    "Secret",
+    "Parameter",
+    "Job",
+    "Pipeline",
+    "Repository",
+]
+SUFFIX = [
+    "",
+    "s",
+    "Attribute",
+    "Configuration",
+    "Permission",
+    "Tags",
+    "Version",
+    "Status",
+    "Acl",
+    "Replication",
+]
+
+# (page slug, service name, prefix, actions, resource types, condition keys,
+# whether the page has RunInstances scenario rows)
+SERVICES = [
+    ("amazonec2", "Amazon EC2", "ec2", 560, 60, 160, True),
+    ("amazons3", "Amazon S3", "s3", 160, 10, 80, False),
+    (
+        "awsidentityandaccessmanagementiam",
+        "AWS Identity and Access Management (IAM)",
+        "iam",
+        170,
+        14,
+        24,
+        False,
+    ),
+    ("awskeymanagementservice", "AWS Key Management Service", "kms", 50, 2, 35, False),
+    ("awslambda", "AWS Lambda", "lambda", 70, 6, 20, False),
+    ("amazondynamodb", "Amazon DynamoDB", "dynamodb", 60, 6, 18, False),
+    ("amazonsqs", "Amazon SQS", "sqs", 22, 1, 4, False),
+    ("amazonsns", "Amazon SNS", "sns", 40, 1, 8, False),
+    ("awssecuritytokenservice", "AWS Security Token Service", "sts", 9, 3, 30, False),
+    ("awssecretsmanager", "AWS Secrets Manager", "secretsmanager", 24, 1, 14, False),
+]
+
+
+def words(rng, n):
+    pool = [
+        "grants",
+        "permission",
+        "to",
+        "the",
+        "a",
+        "resource",
+        "for",
+        "an",
+        "account",
+        "specified",
+        "in",
+        "request",
+        "with",
+        "tags",
+        "that",
+        "are",
+        "attached",
+        "filters",
+        "access",
+        "by",
+        "value",
+        "of",
+        "key",
+    ]
+    return " ".join(rng.choice(pool) for _ in range(n))
+
+
+def markup(rng, text):
+    """Escapes a description, ending some of them with inline elements followed by
+    punctuation, as real descriptions name API operations and link other pages"""
+    if rng.random() >= 0.25:
+        return escape(text)
+    noun = rng.choice(NOUNS)
+    element = rng.choice(
+        [
+            f'<code class="code">{noun}</code>',
+            f'<a href="https://docs.aws.amazon.com/">{noun}</a>',
+            f"<b>{noun}</b>",
+        ]
+    )
+    return f'{escape(text)} for {element}, with <a href="#tags">tags</a>.'
+
+
+def gen_service(
+    slug, name, prefix, n_actions, n_resources, n_conditions, scenarios, seed
+):
+    rng = random.Random(seed)
+    resources = []
+    seen = set()
+    while len(resources) < n_resources:
+        res = rng.choice(NOUNS).lower() + rng.choice(
+            ["", "-group", "-set", "-version", "-attachment"]
+        )
+        if res in seen:
+            continue
+        seen.add(res)
+        shape = rng.randint(0, 3)
+        if shape == 0:
+            arn = f"arn:${{Partition}}:{prefix}:${{Region}}:${{Account}}:{res}/${{{res.title().replace('-', '')}Id}}"
+        elif shape == 1:
+            arn = (
+                f"arn:${{Partition}}:{prefix}:::${{{res.title().replace('-', '')}Name}}"
+            )
+        elif shape == 2:
+            arn = f"arn:${{Partition}}:{prefix}:${{Region}}:${{Account}}:{res}:${{{res.title().replace('-', '')}Name}}"
+        else:
+            arn = f"arn:${{Partition}}:{prefix}::${{Account}}:{res}/${{Path}}${{{res.title().replace('-', '')}Name}}"
+        resources.append((res, arn))
+    if prefix == "s3":
+        resources[0] = ("object", "arn:${Partition}:s3:::${BucketName}/${ObjectName}")
+        resources[1] = ("bucket", "arn:${Partition}:s3:::${BucketName}")
+    conditions = []
+    cseen = set()
+    globals_ = ["aws:RequestTag/${TagKey}", "aws:ResourceTag/${TagKey}", "aws:TagKeys"]
+    for g in globals_:
+        conditions.append(
+            (
+                g,
+                "Filters access by " + words(rng, 6),
+                "String" if "TagKeys" not in g else "ArrayOfString",
+            )
+        )
+        cseen.add(g)
+    while len(conditions) < n_conditions:
+        c = f"{prefix}:{rng.choice(NOUNS)}{rng.choice(['Id', 'Name', 'Type', 'Arn', 'Tag/${TagKey}', 'Version', 'Count'])}"
+        if c in cseen:
+            continue
+        cseen.add(c)
+        conditions.append(
+            (
+                c,
+                "Filters access by " + words(rng, rng.randint(4, 14)),
+                rng.choice(
+                    ["String", "ARN", "Bool", "Numeric", "Date", "ArrayOfString"]
+                ),
+            )
+        )
+    actions = []
+    aseen = set()
+    while len(actions) < n_actions:
+        a = rng.choice(VERBS) + rng.choice(NOUNS) + rng.choice(SUFFIX)
+        if a in aseen:
+            continue
+        aseen.add(a)
+        actions.append(a)
+    actions.sort()
+
+    out = []
+    w = out.append
+    w(
+        '<!DOCTYPE html>\n<html xmlns="http://www.w3.org/1999/xhtml" lang="en-US"><head><meta http-equiv="Content-Type" content="text/html; charset=UTF-8" /><title>'
+    )
+    w(
+        f"Actions, resources, and condition keys for {escape(name)} - Service Authorization Reference</title>\n"
+    )
+    w('<meta name="viewport" content="width=device-width,initial-scale=1" />\n')
+    w('<link rel="icon" type="image/ico" href="/assets/images/favicon.ico" />\n')
+    w(
+        '<link rel="shortcut icon" type="image/ico" href="/assets/images/favicon.ico" />\n'
+    )
+    w('<link rel="stylesheet" type="text/css" href="/css/awsdocs.css?v=20181221" />\n')
+    w('<script src="/assets/js/awsdocs-boot.js" defer="defer"></script>\n')
+    w('<script type="text/javascript">var awsdocs = {};</script>\n')
+    w(
+        '</head><body class="awsdocs awsui"><div class="awsdocs-container"><awsdocs-header></awsdocs-header>\n'
+    )
+    w(
+        '<awsui-app-layout id="app-layout" class="awsui-util-no-gutters" ng-controller="ContentController as $ctrl" header-selector="awsdocs-header" navigation-hide="false" navigation-width="$ctrl.navWidth">\n'
+    )
+    w(
+        '<div id="main-content" class="awsui-util-container">\n<div id="main-col-body">\n'
+    )
+    w(
+        f'<h1 class="topictitle" id="list_{slug}">Actions, resources, and condition keys for {escape(name)}</h1>\n'
+    )
+    w(
+        '<div class="awsdocs-page-header-container"><awsdocs-page-header></awsdocs-page-header></div>\n'
+    )
+    w(
+        f'<p>{escape(name)} (service prefix: <code class="code">{prefix}</code>) provides the following service-specific resources, actions, and condition context keys for use in IAM permission policies.</p>\n'
+    )
+    w(
+        '<p><b>References:</b></p>\n<ul><li><p>Learn how to <a href="https://docs.aws.amazon.com/">configure this service</a>.</p></li></ul>\n'
+    )
+    w(
+        f'<h2 id="{slug}-actions-as-permissions">Actions defined by {escape(name)}</h2>\n'
+    )
+    w(
+        '<p>You can specify the following actions in the <code class="code">Action</code> element of an IAM policy statement.</p>\n'
+    )
+    w(
+        '<div class="table-container"><div class="table-contents"><table id="w1aab5c13c27b7">\n<thead><tr>\n<th>Actions</th>\n<th>Description</th>\n<th>Access level</th>\n<th>Resource types (*required)</th>\n<th>Condition keys</th>\n<th>Dependent actions</th>\n</tr></thead>\n'
+    )
+
+    def cond_links(n):
+        picks = rng.sample(conditions, min(n, len(conditions)))
+        return "".join(
+            f'<p><a href="#{slug}-policy-keys">{escape(c[0])}</a></p>' for c in picks
+        )
+
+    def res_cells(res, required):
+        star = "*" if required else ""
+        cond = cond_links(rng.randint(0, 3)) if rng.random() < 0.4 else ""
+        deps = ""
+        if rng.random() < 0.12:
+            deps = "".join(
+                f"<p>{prefix}:{rng.choice(actions)}</p>"
+                for _ in range(rng.randint(1, 2))
+            )
+            if rng.random() < 0.3:
+                deps += "<p>iam:PassRole</p>"
+        if res:
+            rcell = f'<p><a href="#{slug}-{res}">{res}{star}</a></p>'
+        else:
+            rcell = ""
+        return f"<td>\n{rcell}\n</td>\n<td>\n{cond}\n</td>\n<td>\n{deps}\n</td>\n"
+
+    scenario_action = "RunInstances" if scenarios else None
+    if scenarios and scenario_action not in actions:
+        actions.append(scenario_action)
+        actions.sort()
+    for a in actions:
+        access = rng.choice(ACCESS)
+        desc = "Grants permission to " + words(rng, rng.randint(5, 20))
+        permission_only = rng.random() < 0.04
+        nres = rng.choice([1, 1, 1, 2, 2, 3, 4])
+        if a == scenario_action:
+            nres = 5
+        rows = []
+        for i in range(nres):
+            if nres == 1 and rng.random() < 0.3:
+                rows.append(res_cells("", False))
+            else:
+                res = rng.choice(resources)[0]
+                rows.append(res_cells(res, i == 0))
+        total = nres + (2 if a == scenario_action else 0)
+        span = f' rowspan="{total}"' if total > 1 else ""
+        if permission_only:
+            first = (
+                f'<td{span}>\n<a id="{slug}-{a}"></a>\n{a} [permission only]\n</td>\n'
+            )
+        else:
+            first = f'<td{span}>\n<a id="{slug}-{a}"></a>\n<a href="https://docs.aws.amazon.com/{prefix}/latest/APIReference/API_{a}.html">{a}</a>\n</td>\n'
+        w(
+            "<tr>\n"
+            + first
+            + f"<td{span}>{markup(rng, desc)}</td>\n<td{span}>{access}</td>\n"
+            + rows[0]
+            + "</tr>\n"
+        )
+        for j, r in enumerate(rows[1:]):
+            w("<tr>\n" + r + "</tr>\n")
+            if a == scenario_action and j in (1, 2):
+                # Scenario rows have 5 cells, the first one naming the scenario
+                sc = ["EC2-Classic-InstanceStore", "EC2-VPC-InstanceStore-Subnet"][
+                    j - 1
+                ]
+                w(
+                    f"<tr>\n<td>\n{sc}\n</td>\n<td>\n<p>instance*</p><p>image*</p>\n</td>\n<td>\n{cond_links(2)}\n</td>\n<td>\n</td>\n<td>\n</td>\n</tr>\n"
+                )
+    w("</table></div></div>\n")
+
+    w(
+        f'<h2 id="{slug}-resources-for-iam-policies">Resource types defined by {escape(name)}</h2>\n'
+    )
+    w(
+        '<div class="table-container"><div class="table-contents"><table id="w1aab5c13c27b9">\n<thead><tr>\n<th>Resource types</th>\n<th>ARN</th>\n<th>Condition keys</th>\n</tr></thead>\n'
+    )
+    for res, arn in resources:
+        cond = cond_links(rng.randint(0, 3))
+        w(
+            f'<tr>\n<td>\n<a id="{slug}-{res}"></a>\n<a href="https://docs.aws.amazon.com/">{res}</a>\n</td>\n<td>\n<code class="code">{escape(arn)}</code>\n</td>\n<td>\n{cond}\n</td>\n</tr>\n'
+        )
+    w("</table></div></div>\n")
+
+    w(f'<h2 id="{slug}-policy-keys">Condition keys for {escape(name)}</h2>\n')
+    w(
+        '<div class="table-container"><div class="table-contents"><table id="w1aab5c13c27c11">\n<thead><tr>\n<th>Condition keys</th>\n<th>Description</th>\n<th>Type</th>\n</tr></thead>\n'
+    )
+    for c, desc, typ in conditions:
+        w(
+            f'<tr>\n<td>\n<a id="{slug}-{c}"></a>\n<a href="#{slug}-policy-keys">{escape(c)}</a>\n</td>\n<td>{markup(rng, desc)}</td>\n<td>{typ}</td>\n</tr>\n'
+        )
+    w("</table></div></div>\n")
+    w(
+        '<awsdocs-copyright class="copyright-print"></awsdocs-copyright>\n</div>\n</div>\n</awsui-app-layout>\n</div></body></html>\n'
+    )
+    return "".join(out)
+
+
+def gen_index(slugs):
+    links = "\n".join(
+        f'<li><p><a href="./list_{s}.html">{n}</a></p></li>' for s, n in slugs
+    )
+    return (
+        '<!DOCTYPE html>\n<html lang="en-US"><head><title>Actions, resources, and condition keys for AWS services</title></head>\n'
+        '<body><div id="main-content"><div id="main-col-body">\n'
+        '<h1 class="topictitle">Actions, resources, and condition keys for AWS services</h1>\n'
+        f'<div class="highlights"><ul>\n{links}\n</ul></div>\n</div></div></body></html>\n'
+    )
+
+
+def main(dest):
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    for i, (slug, name, prefix, na, nr, nc, sc) in enumerate(SERVICES):
+        (dest / f"list_{slug}.html").write_text(
+            gen_service(slug, name, prefix, na, nr, nc, sc, i)
+        )
+    (dest / "reference_policies_actions-resources-contextkeys.html").write_text(
+        gen_index([(s[0], s[1]) for s in SERVICES])
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
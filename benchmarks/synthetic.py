@@ -0,0 +1,91 @@
+"""Synthetic IAM data shaped like the real AWS docs, for benchmarks.
+
+The default sizes roughly match the Service Authorization Reference: about 420
+services, 17k actions, 1.6k resource types and 3k condition keys.
+"""
+
+import random
+from typing import List
+
+ACCESS_LEVELS = ["List", "Read", "Write", "Permissions management", "Tagging"]
+VERBS = ["Create", "Delete", "Describe", "Get", "List", "Put", "Update", "Tag"]
+NOUNS = ["Instance", "Volume", "Bucket", "Object", "Policy", "Role", "Key", "Table"]
+NOUNS += ["Stream", "Function", "Queue", "Topic", "Cluster", "Image", "Secret", "Job"]
+SUFFIXES = ["", "s", "Attribute", "Configuration", "Permission", "Tags", "Version"]
+WORDS = """access account alarm alias analysis application archive association
+attachment backup bucket build cache capacity certificate change channel cluster
+configuration connection container dashboard data database deployment
+destination device directory domain encryption endpoint environment event
+execution export filter fleet function gateway group health identity image import
+index instance integration inventory job key layer lifecycle listener log
+maintenance metric model monitor namespace network notebook notification object
+parameter partition permission pipeline policy profile project queue quota
+recommendation record registry replication report repository request reservation
+resource role route rule schedule schema secret session share snapshot source
+stack state stream subnet subscription table tag target task template thing
+topic trail trust user version volume workflow workspace""".split()
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def make_service(
+    index: int, actions: int = 40, resources: int = 4, conditions: int = 7
+) -> dict:
+    rng = random.Random(index)
+    prefix = f"svc{index}"
+    resource_names = [f"{rng.choice(NOUNS).lower()}{i}" for i in range(resources)]
+    condition_names = ["aws:RequestTag/${TagKey}", "aws:ResourceTag/${TagKey}"]
+    condition_names += [f"{prefix}:{rng.choice(NOUNS)}{i}" for i in range(conditions)]
+    names = set()
+    while len(names) < actions:
+        names.add(rng.choice(VERBS) + rng.choice(NOUNS) + rng.choice(SUFFIXES))
+    privileges = []
+    for name in sorted(names):
+        resource_types = []
+        for resource in rng.sample(resource_names, rng.randint(0, 2)):
+            resource_types.append(
+                {
+                    "resource_type": resource + rng.choice(["", "*"]),
+                    "condition_keys": rng.sample(condition_names, rng.randint(0, 2)),
+                    "dependent_actions": [
+                        f"{prefix}:{rng.choice(sorted(names))}"
+                        for _ in range(rng.random() < 0.1)
+                    ],
+                }
+            )
+        privileges.append(
+            {
+                "privilege": name,
+                "description": "Grants permission to " + _words(rng, 8),
+                "access_level": rng.choice(ACCESS_LEVELS),
+                "resource_types": resource_types,
+            }
+        )
+    return {
+        "service_name": f"Service {index}",
+        "prefix": prefix,
+        "privileges": privileges,
+        "resources": [
+            {
+                "resource": resource,
+                "arn": f"arn:${{Partition}}:{prefix}:${{Region}}:${{Account}}:"
+                f"{resource}/${{{resource.title()}Id}}",
+                "condition_keys": rng.sample(condition_names, 2),
+            }
+            for resource in resource_names
+        ],
+        "conditions": [
+            {
+                "condition": condition,
+                "description": "Filters access by " + _words(rng, 8),
+                "type": rng.choice(["String", "ARN", "Bool", "ArrayOfString"]),
+            }
+            for condition in condition_names
+        ],
+    }
+
+
+def make_services(count: int = 420) -> List[dict]:
+    return [make_service(index) for index in range(count)]